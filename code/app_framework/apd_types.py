@@ -3,8 +3,10 @@
 # async def _event(self, event, data, kwargs):
 
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from enum import Enum
+import threading
 import hassapi as hass  # type:ignore
 from typing import Any, Callable, Dict, List, Tuple, Union
 
@@ -87,13 +89,15 @@ SensorsType = Union[SensorsABC, None]
 
 class ApDefBase(ABC):
     args: dict = {}
+    # cached result of logger level check, set by logger decorators
+    debug_on: bool = True
 
     @abstractmethod
     def initialize(self):
         self.init_done: bool = False
 
     @abstractmethod
-    def debug(self, msg):
+    def debug(self, msg, *args):
         ...
 
     @abstractmethod
@@ -105,15 +109,15 @@ class ApDefBase(ABC):
         ...
 
     @abstractmethod
-    def info(self, msg):
+    def info(self, msg, *args):
         ...
 
     @abstractmethod
-    def warning(self, msg):
+    def warning(self, msg, *args):
         ...
 
     @abstractmethod
-    def error(self, msg):
+    def error(self, msg, *args):
         ...
 
     @abstractmethod
@@ -172,6 +176,9 @@ class ApDefBase(ABC):
     def sync_cancel_listen_event(self, handle):
         self.cancel_listen_event(handle)  # type:ignore
 
+    def sync_cancel_listen_state(self, handle):
+        self.cancel_listen_state(handle)  # type:ignore
+
     @abstractmethod
     async def get_state(
         self, entity_id=None, attribute=None, default=None, copy=True, **kwargs
@@ -191,9 +198,15 @@ class ApDefBase(ABC):
 
     def sync_turn_on(self, entity_id, **kwargs):
         self.turn_on(entity_id, **kwargs)  # type:ignore
+        self._state_written(entity_id)
 
     def sync_turn_off(self, entity_id, **kwargs):
         self.turn_off(entity_id, **kwargs)  # type: ignore
+        self._state_written(entity_id)
+
+    def _state_written(self, entity_id: Any):
+        """Own change of entity state - for caches of reading"""
+        pass
 
     def sync_run_in(self, callback, delay, **kwargs):
         self.run_in(callback, delay, **kwargs)  # type:ignore
@@ -209,7 +222,9 @@ class ApDefBase(ABC):
         return self.entity_exists(entity_id, **kwargs)  # type: ignore
 
     def sync_listen_event(self, callback, event=None, **kwargs):
-        self.listen_event(callback=callback, event=event, **kwargs)  # type:ignore
+        return self.listen_event(  # type:ignore
+            callback=callback, event=event, **kwargs
+        )
 
     @abstractmethod
     async def set_state(self, entity, **kwargs):
@@ -217,6 +232,7 @@ class ApDefBase(ABC):
 
     def sync_set_state(self, entity, **kwargs):
         self.set_state(entity, **kwargs)  # type: ignore
+        self._state_written(entity)
 
     @abstractmethod
     async def listen_state(self, callback, entity=None, **kwargs):
@@ -224,7 +240,7 @@ class ApDefBase(ABC):
         ...
 
     def sync_listen_state(self, callback, entity=None, **kwargs):
-        self.listen_state(callback, entity, **kwargs)  # type:ignore
+        return self.listen_state(callback, entity, **kwargs)  # type:ignore
 
     @abstractmethod
     async def call_service(self, service, **kwargs):
@@ -232,6 +248,7 @@ class ApDefBase(ABC):
 
     def sync_call_service(self, service, **kwargs):
         self.call_service(service, **kwargs)  # type: ignore
+        self._state_written(kwargs.get("entity_id"))
 
 
 class APBasicApp(ApDefBase):
@@ -261,13 +278,13 @@ class APBasicApp(ApDefBase):
     @abstractmethod
     async def set_sensor_state(
         self, entity_id: EntityName, state: Any, attr: DictMixed = {}
-    ):
+    ) -> bool:
         ...
 
     @abstractmethod
     def sync_set_sensor_state(
         self, entity_id: EntityName, state: Any, attr: DictMixed = {}
-    ):
+    ) -> bool:
         ...
 
     @abstractmethod
@@ -401,17 +418,23 @@ class ChildObject:
         if self.module_name == "":
             self.module_name = self._ba.__class__.__name__
 
-    def debug(self, msg):
-        self._ba.debug(f"({self.module_name}) {msg}")
+    @property
+    def debug_on(self) -> bool:
+        return self._ba.debug_on
+
+    def debug(self, msg, *args):
+        if not self._ba.debug_on:
+            return
+        self._ba.debug(f"({self.module_name}) {msg}", *args)
 
-    def info(self, msg):
-        self._ba.info(f"({self.module_name}) {msg}")
+    def info(self, msg, *args):
+        self._ba.info(f"({self.module_name}) {msg}", *args)
 
-    def warning(self, msg):
-        self._ba.warning(f"({self.module_name}) {msg}")
+    def warning(self, msg, *args):
+        self._ba.warning(f"({self.module_name}) {msg}", *args)
 
-    def error(self, msg):
-        self._ba.error(f"({self.module_name}) {msg}")
+    def error(self, msg, *args):
+        self._ba.error(f"({self.module_name}) {msg}", *args)
 
     async def create_task(self, coro, callback=None, **kwargs) -> HandlerCreateTask:
         return await self._ba.create_task(coro, callback, **kwargs)
@@ -448,28 +471,84 @@ class ChildObjectBasicApp(ChildObject):
     def sync_get_attr_state(self, entity_id: EntityName, attr: str) -> str:
         return self._ba.sync_get_attr_state(entity_id, attr)
 
-    def sync_set_sensor_state(self, entity_id: EntityName, state: Any, attr: DictMixed):
-        self._ba.sync_set_sensor_state(entity_id, state, attr)
+    def sync_set_sensor_state(
+        self, entity_id: EntityName, state: Any, attr: DictMixed
+    ) -> bool:
+        return self._ba.sync_set_sensor_state(entity_id, state, attr)
 
     async def set_sensor_state(
         self, entity_id: EntityName, state: Any, attr: DictMixed
-    ):
-        await self._ba.set_sensor_state(entity_id, state, attr)
+    ) -> bool:
+        return await self._ba.set_sensor_state(entity_id, state, attr)
 
 
 # Using for BootModule without BasicApp
+class ExecutorGuard:
+    """Threads of run_in_executor started by one task execution
+
+    Cancelling of waiting does not stop thread - task is not executed
+    again while its thread from expired execution is running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running: int = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.running > 0
+
+    async def run(self, run_in_executor: Callable, func, *args, **kwargs):
+        started = False
+        abandoned = False
+
+        def guarded(*f_args, **f_kwargs):
+            nonlocal started
+            with self._lock:
+                if abandoned:
+                    return None
+                started = True
+            try:
+                return func(*f_args, **f_kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        with self._lock:
+            self.running += 1
+        try:
+            return await run_in_executor(guarded, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                if not started:
+                    # thread will not run func
+                    abandoned = True
+                    self.running -= 1
+            raise
+
+
+# ExecutorGuard of TaskCoro being executed, set by TaskCoro
+executor_guard: ContextVar = ContextVar("executor_guard", default=None)
+
+
 class ApHass(hass.Hass, ApDefBase):
-    def debug(self, msg):
-        self.logger.debug(msg)
+    async def run_in_executor(self, func, *args, **kwargs):
+        guard: Union[ExecutorGuard, None] = executor_guard.get()
+        if guard is None:
+            return await super().run_in_executor(func, *args, **kwargs)
+        return await guard.run(super().run_in_executor, func, *args, **kwargs)
 
-    def info(self, msg):
-        self.logger.info(msg)
+    def debug(self, msg, *args):
+        self.logger.debug(msg, *args)
 
-    def warning(self, msg):
-        self.logger.warning(msg)
+    def info(self, msg, *args):
+        self.logger.info(msg, *args)
 
-    def error(self, msg):
-        self.logger.error(msg)
+    def warning(self, msg, *args):
+        self.logger.warning(msg, *args)
+
+    def error(self, msg, *args):
+        self.logger.error(msg, *args)
 
 
 @dataclass
@@ -570,7 +649,7 @@ class BufferInstanceABC(ChildObjectBasicApp):
         return self._ba.register  # type:ignore
 
     @abstractmethod
-    async def execution_finished(self) -> Any:
+    async def execution_finished(self, task_param: TaskParamType = None) -> Any:
         ...
 
     @abstractmethod
@@ -622,6 +701,9 @@ class BufferABC(ABC):
     async def clear_queue(self):
         pass
 
+    async def task_done(self, task_base: Any, instance_name: InstanceNameType = None):
+        pass
+
     def sync_put_in_queue(
         self,
         task: Any,
@@ -23,10 +23,13 @@ from helper_types import (
     StateType,
 )
 from bootstart import apf_module
-from typing import Any, NoReturn, Optional
+from state_cache import STATE_CACHE_TTL, StateCache, StateCacheType
+from typing import Any, NoReturn, Optional, Tuple
 
 
 class BasicApp(APBasicApp):
+    _state_cache: StateCacheType = None
+
     def initialize(self):
         # Just ony type
         # use decorator
@@ -35,6 +38,7 @@ class BasicApp(APBasicApp):
         self.error = self.logger.error
         self.warning = self.logger.warning
         self.info = self.logger.info
+        self.debug_on = False
         self.do_log = False
 
         module_name = h.module_name(self)
@@ -126,6 +130,110 @@ class BasicApp(APBasicApp):
             message=self._msg,
         )
 
+    def _mirror_lookup(self, entity_id: str, attribute: Any = None) -> Tuple[bool, Any]:
+        """Looking in g.state_mirror (WsHA) - no round trip to AppDaemon
+
+        Args:
+            entity_id (str): entity name
+            attribute (Any, optional): as for get_state. Defaults to None.
+
+        Returns:
+            Tuple[bool, Any]: found, value
+        """
+        if g.state_mirror is None:
+            return False, None
+        return g.state_mirror.lookup(entity_id, attribute)
+
+    @property
+    def state_cache(self) -> StateCache:
+        """Read-through cache of this app, args state_cache_ttl (0 - off)"""
+        if self._state_cache is None:
+            self._state_cache = StateCache(
+                h.par(self.args, "state_cache_ttl", STATE_CACHE_TTL)
+            )
+        return self._state_cache
+
+    def _state_cache_changed(self, entity, attribute, old, new, kwargs):
+        self.state_cache.invalidate(entity)
+
+    def _state_written(self, entity_id: Any):
+        if self._state_cache is None:
+            return
+        if isinstance(entity_id, str):
+            self._state_cache.invalidate(entity_id)
+        elif isinstance(entity_id, (list, tuple)):
+            for e in entity_id:
+                self._state_cache.invalidate(e)
+
+    async def _get_state(self, entity_id: str, attribute: Any = None) -> Any:
+        found, value = self._mirror_lookup(entity_id, attribute)
+        if found:
+            return value
+        found, value = self.state_cache.get(entity_id, attribute)
+        if found:
+            return value
+        if self.state_cache.watch(entity_id):
+            # before reading - change during reading must invalidate
+            await self.listen_state(
+                self._state_cache_changed, entity_id, attribute="all"
+            )
+        version = self.state_cache.version(entity_id)
+        if attribute is None:
+            value = await self.get_state(entity_id)
+        else:
+            value = await self.get_state(entity_id, attribute=attribute)
+        self.state_cache.put(entity_id, attribute, value, version)
+        return value
+
+    def _sync_get_state(self, entity_id: str, attribute: Any = None) -> Any:
+        found, value = self._mirror_lookup(entity_id, attribute)
+        if found:
+            return value
+        found, value = self.state_cache.get(entity_id, attribute)
+        if found:
+            return value
+        if self.state_cache.watch(entity_id):
+            # before reading - change during reading must invalidate
+            self.sync_listen_state(
+                self._state_cache_changed, entity_id, attribute="all"
+            )
+        version = self.state_cache.version(entity_id)
+        value = self.sync_get_state(entity_id, attribute=attribute)
+        self.state_cache.put(entity_id, attribute, value, version)
+        return value
+
+    def _state_float(self, entity_id: str, value: Any) -> float:
+        """Float of state, parsed once per change of cached state"""
+        found, retval = self.state_cache.get_parsed(entity_id, "float", value)
+        if found:
+            return retval
+        if isinstance(value, str) and len(value) > 0:
+            retval = float(value)
+        else:
+            retval = 0
+        self.state_cache.put_parsed(entity_id, "float", value, retval)
+        return retval
+
+    async def _entity_exists(self, entity_id: str) -> bool:
+        exists: BoolType = None
+        if g.state_mirror is not None:
+            exists = g.state_mirror.exists(entity_id)
+        if exists is None and self.state_cache.exists(entity_id):
+            exists = True
+        if exists is None:
+            return await self.entity_exists(entity_id)
+        return exists
+
+    def _sync_entity_exists(self, entity_id: str) -> bool:
+        exists: BoolType = None
+        if g.state_mirror is not None:
+            exists = g.state_mirror.exists(entity_id)
+        if exists is None and self.state_cache.exists(entity_id):
+            exists = True
+        if exists is None:
+            return self.sync_entity_exists(entity_id)
+        return exists
+
     async def entity_error(self, entity_id: str) -> bool:
         """Checking if entity exists and state is not unavailable fire event "ENTITY_ERROR"
 
@@ -135,9 +243,9 @@ class BasicApp(APBasicApp):
         Returns:
             bool: True if there is found error
         """
-        not_exists = not self.entity_exists(entity_id)
+        not_exists = not await self._entity_exists(entity_id)
         if not not_exists:
-            not_exists = await self.get_state(entity_id) == g.UNAVAILABLE
+            not_exists = await self._get_state(entity_id) == g.UNAVAILABLE
         if not_exists:
             await self.fire_event(e.ENTITY_ERROR, entity_id=entity_id)
             self.error(f"Error entity: {entity_id}")
@@ -152,9 +260,9 @@ class BasicApp(APBasicApp):
         Returns:
             bool: True if there is found error
         """
-        not_exists = not self.sync_entity_exists(entity_id)
+        not_exists = not self._sync_entity_exists(entity_id)
         if not not_exists:
-            not_exists = self.sync_get_state(entity_id) == g.UNAVAILABLE
+            not_exists = self._sync_get_state(entity_id) == g.UNAVAILABLE
         if not_exists:
             self.sync_fire_event(e.ENTITY_ERROR, entity_id=entity_id)
             self.error(f"Error entity: {entity_id}")
@@ -207,10 +315,12 @@ class BasicApp(APBasicApp):
         if await self.is_entity_on(entity_id):
             self.logger.debug("Entity on")
             await self.turn_off(entity_id)
+            self._state_written(entity_id)
             return False
         else:
             self.debug("Entity off")
             await self.turn_on(entity_id)
+            self._state_written(entity_id)
             return True
 
     def sync_turn(self, entity_id: str, yes: Any) -> BoolType:
@@ -248,9 +358,11 @@ class BasicApp(APBasicApp):
             return None
         if h.yes(yes) and not await self.is_entity_on(entity_id):
             await self.turn_on(entity_id)
+            self._state_written(entity_id)
             return True
         elif not h.yes(yes) and not await self.is_entity_off(entity_id):
             await self.turn_off(entity_id)
+            self._state_written(entity_id)
         return False
 
     async def get_attr_state_float(self, entity_id: str, attr: str) -> float:
@@ -301,13 +413,7 @@ class BasicApp(APBasicApp):
         Returns:
             float: state value
         """
-        retval: float = 0
-        value = await self.get_state(entity_id)
-        if isinstance(value, str) and len(value) > 0:
-            retval = float(value)
-        else:
-            retval = 0
-        return retval
+        return self._state_float(entity_id, await self._get_state(entity_id))
 
     def sync_get_state_float(self, entity_id: str) -> float:
         """Converting state to float in case of error returning
@@ -318,16 +424,10 @@ class BasicApp(APBasicApp):
         Returns:
             float: state value
         """
-        retval: float = 0
-        value = self.get_state(entity_id)
-        if isinstance(value, str) and len(value) > 0:
-            retval = float(value)
-        else:
-            retval = 0
-        return retval
+        return self._state_float(entity_id, self._sync_get_state(entity_id))
 
     async def get_state_bool(self, entity_id: str) -> bool:
-        return h.yes(await self.get_state(entity_id))
+        return h.yes(await self._get_state(entity_id))
 
     def sync_get_state_seconds(self, entity_id: str) -> int:
         """Using for input_number converting minutes to seconds
@@ -382,14 +482,14 @@ class BasicApp(APBasicApp):
         Returns:
             bool: return True if is entity on
         """
-        state = await self.get_state(entity_id)
+        state = await self._get_state(entity_id)
         return state == g.ON
 
     async def get_state_str(self, entity_id: str) -> str:
-        return str(await self.get_state(entity_id))
+        return str(await self._get_state(entity_id))
 
     def sync_get_state_str(self, entity_id: str) -> str:
-        s = self.get_state(entity_id)
+        s = self._sync_get_state(entity_id)
         if s is not None:
             return str(s)
         else:
@@ -618,8 +718,8 @@ class BasicApp(APBasicApp):
         Returns:
             bool: if entity_id is not exists returning False
         """
-        if await self.entity_exists(entity_id):
-            state = await self.get_state(entity_id)
+        if await self._entity_exists(entity_id):
+            state = await self._get_state(entity_id)
         else:
             return False
         return h.yes(state)
@@ -633,8 +733,8 @@ class BasicApp(APBasicApp):
         Returns:
             bool: if entity_id is not exists returning False
         """
-        if self.entity_exists(entity_id):
-            state = self.get_state(entity_id)
+        if self._sync_entity_exists(entity_id):
+            state = self._sync_get_state(entity_id)
         else:
             return False
         return h.yes(state)
@@ -651,7 +751,7 @@ class BasicApp(APBasicApp):
         """
 
         try:
-            retval = await self.get_state(entity_id, attribute=attr)
+            retval = await self._get_state(entity_id, attribute=attr)
             if isinstance(retval, int):
                 return str(retval)
             elif not isinstance(retval, str):
@@ -675,7 +775,7 @@ class BasicApp(APBasicApp):
         """
         retval: str = ""
         try:
-            retval = str(self.sync_get_state(entity_id, attribute=attr))
+            retval = str(self._sync_get_state(entity_id, attribute=attr))
             if retval is None:
                 retval = ""
         except:
@@ -693,7 +793,7 @@ class BasicApp(APBasicApp):
         """
 
         try:
-            return await self.get_state(entity_id, attribute="all")  # type: ignore
+            return await self._get_state(entity_id, attribute="all")  # type: ignore
         except:
             return None
 
@@ -708,35 +808,38 @@ class BasicApp(APBasicApp):
         """
 
         try:
-            return self.get_state(entity_id, attribute="all")  # type: ignore
+            return self._sync_get_state(entity_id, attribute="all")  # type: ignore
         except:
             return None
 
     def sync_set_sensor_state(
         self, entity_id: EntityName, state: Any, attr: DictMixed = {}
-    ):
+    ) -> bool:
         if not isinstance(entity_id, str) or len(entity_id) == 0:
             self.error(f"Error in calling sync_set_sensor_state: {entity_id}")
-            return
+            return False
 
         all_state = self.sync_get_all_state(entity_id)
         if all_state is None:
-            return
+            return False
         all_attr: dict = all_state.get("attributes", {})
 
         all_attr.update(h.get_dict(attr))
         self.sync_set_state(entity_id, state=state, attributes=all_attr)
+        return True
 
     async def set_sensor_state(
         self, entity_id: EntityName, state: Any, attr: dict = {}
-    ):
+    ) -> bool:
         all_state = await self.get_all_state(entity_id)
         if all_state is None:
-            return
+            return False
         all_attr: dict = all_state.get("attributes", {})
 
         all_attr.update(h.get_dict(attr))
         await self.set_state(entity_id, state=state, attributes=all_attr)
+        self._state_written(entity_id)
+        return True
 
     @sync_wrapper
     async def get_attributes(self, entity_id: str) -> DictType:
@@ -10,6 +10,7 @@ except Exception as ex:
 
 from apd_types import BootStartBase, FutureTask
 import hassapi as hass  # type:ignore
+import logging
 from functools import wraps
 import decorators as d
 
@@ -100,6 +101,7 @@ def boot_logger(func):
             hass.error = hass.logger.error
             hass.info = hass.logger.info
             hass.warning = hass.logger.warning
+            hass.debug_on = log.isEnabledFor(logging.DEBUG)
         return func(hass)
 
     return wrapper
@@ -119,6 +121,7 @@ def boot_logger_off(func):
             hass.error = hass.logger.error
             hass.info = hass.logger.info
             hass.warning = hass.logger.warning
+            hass.debug_on = log.isEnabledFor(logging.DEBUG)
         return func(hass)
 
     return wrapper
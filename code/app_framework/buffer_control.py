@@ -3,7 +3,14 @@ Main buffer for controlling queues
 Each bufferControl has its own BufferInstance - this is core fo task registers
 
 """
+import asyncio
 from enum import Enum
+import heapq
+from inspect import iscoroutine
+import itertools
+import re
+import threading
+import time
 from apd_types import (
     BufferInstanceABC,
     BufferInstanceType,
@@ -23,10 +30,20 @@ from basic_app import HassBasicApp
 
 from bootstart import boot_logger, boot_logger_off, boot_module
 
-from buffer_instance import BufferInstance
+from buffer_instance import (
+    EXPECTATION_RETRIES,
+    EXPECTATION_TIMEOUT,
+    MAX_CONCURRENCY,
+    MAX_DEPTH,
+    REJECT,
+    BufferInstance,
+)
 from decorators import sync_wrapper
+import globals as g
+from globals_def import GEVNT
+from sensor_entities import StateSensorObj
 
-from typing import Any, Union
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
 from helper_tools import MyHelp as h
 
 from task_register import (
@@ -36,6 +53,379 @@ from task_register import (
 
 from helper_types import StrType, TaskNameType
 
+LOOP_RETEST = 1  # [s] next check if loop was not executed - as former polling
+METRICS_INTERVAL = 60  # [s] publishing of buffer metrics sensors, 0 - off
+METRICS_SENSOR = "sensor.apf_buffer_"  # + instance name, sensor per buffer instance
+STATE_COALESCE = 0.1  # [s] BUFFER_INSTANCE_STATE_CHANGED events in window dispatched once
+# framework events fired also on AppDaemon bus for external listeners, None - all
+# as before bus, trimming by mirror_events arg e.g. [BUFFER_STARTED, TASK_TIMEOUT]
+MIRROR_EVENTS = None
+
+
+class LoopScheduler:
+    """One coroutine for all TaskLoop - sleeping till the nearest due time
+
+    TaskLoop is checked (loop_run, loop_testing_function, time overflow) only
+    when its frequence passed, or every LOOP_RETEST if it was not executed.
+    """
+
+    def __init__(self, parent: "BufferControl"):
+        self._parent = parent
+        self._heap: List[Tuple[float, int, TaskLoopABC]] = []
+        self._valid: Dict[int, int] = {}  # id(task): seq of valid heap entry
+        self._seq: int = 0
+        self._handler: Any = None
+        self._wakeup: Union[asyncio.Event, None] = None
+        self.loops: int = 0  # known loops
+        self.wakeups: int = 0
+        self.checks: int = 0
+        self.executions: int = 0
+        self._started: float = 0
+
+    def add(self, task: TaskLoopABC, due: float = 0):
+        """Scheduling loop, due 0 - check as soon as possible
+
+        Can be called also from thread (AppDaemon sync callbacks)
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._parent.create_task(self._async_add(task, due))
+            return
+        self._add(task, due)
+
+    async def _async_add(self, task: TaskLoopABC, due: float):
+        self._add(task, due)
+
+    def _add(self, task: TaskLoopABC, due: float):
+        if id(task) not in self._valid:
+            self.loops += 1
+        self._seq += 1
+        self._valid[id(task)] = self._seq
+        heapq.heappush(self._heap, (due, self._seq, task))
+        if self._handler is None:
+            self._started = time.monotonic()
+            self._wakeup = asyncio.Event()
+            self._handler = asyncio.get_running_loop().create_task(self._run())
+        elif self._wakeup is not None:
+            self._wakeup.set()
+
+    def remove(self, task: TaskLoopABC):
+        """Heap entry is skipped, running loop is not scheduled again"""
+        if self._valid.pop(id(task), None) is not None:
+            self.loops -= 1
+
+    def _schedule_next(self, task: Any, now: float):
+        due = task._timestamp_end + task.frequence
+        if due <= now:
+            due = now + LOOP_RETEST
+        self._add(task, due)
+
+    async def _run(self):
+        assert self._wakeup is not None
+        while True:
+            now = await self._parent.now()
+            due: list = []
+            while len(self._heap) > 0 and self._heap[0][0] <= now:
+                _, seq, task = heapq.heappop(self._heap)
+                if self._valid.get(id(task)) != seq:
+                    continue  # replaced by newer add
+                del self._valid[id(task)]
+                self.loops -= 1
+                due.append(task)
+            # slow loop_testing_function does not delay other loops
+            results = await asyncio.gather(
+                *(self._check(task, now) for task in due), return_exceptions=True
+            )
+            for task, result in zip(due, results):
+                if isinstance(result, Exception):
+                    template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                    self._parent.error(
+                        template.format(type(result).__name__, result.args)
+                    )
+                    self._add(task, now + LOOP_RETEST)
+            self._wakeup.clear()
+            delay = None if len(self._heap) == 0 else max(self._heap[0][0] - now, 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeups += 1
+
+    async def _check(self, task: Any, now: float):
+        """The same as former TaskLoop._main_loop for one second"""
+        if not task._loop_run or task.frequence <= 0:
+            # parked, loop_run(True) is scheduling again
+            return
+        self.checks += 1
+        go_loop = await task._go_loop()
+        if go_loop is not None and go_loop:
+            if await task._check_time_overflow():
+                self._valid[id(task)] = -1  # running, not in heap
+                self.loops += 1
+                await self._parent.create_task(self._execute(task))
+                return
+        self._schedule_next(task, now)
+
+    async def _execute(self, task: Any):
+        self.executions += 1
+        try:
+            await task.exec_time_overflow()
+        finally:
+            if self._valid.get(id(task)) == -1:
+                del self._valid[id(task)]
+                self.loops -= 1
+                self._schedule_next(task, await self._parent.now())
+
+    @property
+    def stats(self) -> dict:
+        minutes = max(time.monotonic() - self._started, 1) / 60
+        return dict(
+            loops=self.loops,
+            wakeups=self.wakeups,
+            wakeups_per_minute=round(self.wakeups / minutes, 1),
+            # each loop was waking up every second
+            polling_wakeups_per_minute=self.loops * 60,
+            checks=self.checks,
+            executions=self.executions,
+        )
+
+    def stop(self):
+        if self._handler is not None:
+            self._handler.cancel()
+        self._handler = None
+
+
+class EventBus:
+    """In-process events of buffer instances and tasks
+
+    Callbacks have signature of AppDaemon listen_event callback
+    (event, data, kwargs), sync or async, and are called directly.
+    Events in mirror (all if None) are fired also on AppDaemon bus.
+    """
+
+    def __init__(
+        self, parent: "BufferControl", mirror: Union[Iterable[str], None] = None
+    ):
+        self._parent = parent
+        self.mirror = None if mirror is None else set(mirror)
+        self._lock = threading.Lock()  # listen/cancel from AppDaemon threads
+        # event: {handle: (callback, kwargs)}
+        self._listeners: Dict[str, Dict[int, Tuple[Callable, dict]]] = {}
+        self._events: Dict[int, str] = {}  # handle: event
+        self._handles = itertools.count(1)
+        self.fired: int = 0
+        self.dispatched: int = 0
+        self.mirrored: int = 0
+
+    def listen(self, callback: Callable, event: str, **kwargs) -> int:
+        """Can be called also from thread (AppDaemon sync callbacks)
+
+        Returns:
+            int: handle for cancel
+        """
+        with self._lock:
+            handle = next(self._handles)
+            self._listeners.setdefault(event, {})[handle] = (callback, kwargs)
+            self._events[handle] = event
+        return handle
+
+    def cancel(self, handle: int):
+        """Can be called also from thread (AppDaemon sync callbacks)"""
+        with self._lock:
+            event = self._events.pop(handle, None)
+            if event is not None:
+                self._listeners[event].pop(handle, None)
+
+    async def fire(self, event: str, **data):
+        self.fired += 1
+        with self._lock:
+            listeners = list(self._listeners.get(event, {}).values())
+        if listeners:
+            for callback, kwargs in listeners:
+                self.dispatched += 1
+                try:
+                    result = callback(event, data, kwargs)
+                    if iscoroutine(result):
+                        await result
+                except Exception as ex:
+                    template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                    self._parent.error(template.format(type(ex).__name__, ex.args))
+        if self.mirror is None or event in self.mirror:
+            self.mirrored += 1
+            await self._parent.fire_event(event, **data)
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            listeners=len(self._events),
+            fired=self.fired,
+            dispatched=self.dispatched,
+            mirrored=self.mirrored,
+        )
+
+
+class StateChangeDispatcher:
+    """One listener of BUFFER_INSTANCE_STATE_CHANGED for all tasks
+
+    All tasks are kept by buffer instance, listen_to_state_event is checked
+    at dispatching - task can change it anytime. Event with "instance" in data is dispatched to tasks of this instance,
+    otherwise to all. Events arriving within coalesce window are dispatched
+    once, state_changed of tasks is called concurrently.
+    """
+
+    def __init__(self, parent: "BufferControl", coalesce: float = STATE_COALESCE):
+        self._parent = parent
+        self.coalesce = coalesce
+        self._tasks: Dict[str, TaskBaseList] = {}
+        self._handler: Any = None  # listen_event
+        self._flush_handler: Any = None
+        self._pending: set = set()  # instances to dispatch
+        self._pending_all: bool = False
+        self.events: int = 0
+        self.dispatches: int = 0
+        self.calls: int = 0
+
+    def add(self, task_obj: TaskBaseABC):
+        instance_name = str(task_obj.buffer_instance_name)
+        self._tasks.setdefault(instance_name, []).append(task_obj)
+        if self._handler is None:
+            self._handler = self._parent.sync_listen_event(
+                self._event, GEVNT.BUFFER_INSTANCE_STATE_CHANGED.value
+            )
+
+    async def _event(self, event, data, kwargs):
+        self.events += 1
+        instance_name = data.get("instance") if isinstance(data, dict) else None
+        if instance_name is None:
+            self._pending_all = True
+        else:
+            self._pending.add(str(instance_name))
+        if self._flush_handler is None:
+            self._flush_handler = asyncio.get_running_loop().create_task(
+                self._flush()
+            )
+
+    def remove(self, task_obj: TaskBaseABC):
+        group = self._tasks.get(str(task_obj.buffer_instance_name), [])
+        if task_obj in group:
+            group.remove(task_obj)
+
+    async def _flush(self):
+        """Only one flush is running, events arriving during dispatching
+        are dispatched in next window"""
+        try:
+            while self._pending_all or len(self._pending) > 0:
+                if self.coalesce > 0:
+                    await asyncio.sleep(self.coalesce)
+                if self._pending_all:
+                    groups = list(self._tasks.values())
+                else:
+                    groups = [self._tasks.get(name, []) for name in self._pending]
+                self._pending = set()
+                self._pending_all = False
+                await self._dispatch(groups)
+        finally:
+            self._flush_handler = None
+
+    async def _dispatch(self, groups: List[TaskBaseList]):
+        tasks = [
+            task_obj
+            for group in groups
+            for task_obj in group
+            if getattr(task_obj, "listen_to_state_event", False)
+        ]
+        if len(tasks) == 0:
+            return
+        self.dispatches += 1
+        self.calls += len(tasks)
+        results = await asyncio.gather(
+            *(task_obj.state_changed() for task_obj in tasks),  # type: ignore
+            return_exceptions=True,
+        )
+        for task_obj, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                self._parent.error(
+                    f"state_changed of {task_obj.name}: "
+                    + template.format(type(result).__name__, result.args)
+                )
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            tasks=sum(len(group) for group in self._tasks.values()),
+            events=self.events,
+            dispatches=self.dispatches,
+            calls=self.calls,
+        )
+
+
+class MetricsPublisher:
+    """Metrics of buffer instances as sensors, every METRICS_INTERVAL
+
+    State of sensor is executions per minute, attributes are percentiles
+    of queue wait and execution, summary and per task. Sensor is written
+    only when metrics changed.
+    """
+
+    def __init__(self, parent: "BufferControl", interval: float):
+        self._parent = parent
+        self.interval = interval
+        self._sensors: Dict[str, StateSensorObj] = {}
+        self._published: Dict[str, dict] = {}
+        self._handler: Any = None
+        self.publications: int = 0
+
+    def start(self):
+        """Can be called also from thread (AppDaemon sync callbacks)"""
+        if self.interval <= 0 or self._handler is not None:
+            return
+        try:
+            self._handler = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            self._handler = self._parent.create_task(self._run())
+
+    def _sensor(self, instance_name: str) -> StateSensorObj:
+        sensor = self._sensors.get(instance_name)
+        if sensor is None:
+            entity_id = METRICS_SENSOR + re.sub(r"\W", "_", instance_name.lower())
+            sensor = StateSensorObj(
+                self._parent,
+                entity_id,
+                friendly_name=f"Buffer {instance_name}",
+                attributes={},
+            )
+            if not h.stored_exists(entity_id, g.sensor_register):
+                h.stored_push(entity_id, g.sensor_register, sensor)
+            self._sensors[instance_name] = sensor
+        return sensor
+
+    async def publish(self):
+        for instance_name, snapshot in self._parent.metrics_snapshot().items():
+            if self._published.get(instance_name) == snapshot:
+                continue
+            self._published[instance_name] = snapshot
+            await self._sensor(instance_name).async_set_entity_state(
+                snapshot["per_minute"], dict(snapshot)
+            )
+            self.publications += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.publish()
+            except Exception as ex:
+                template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                self._parent.error(template.format(type(ex).__name__, ex.args))
+
+    def stop(self):
+        if self._handler is not None:
+            self._handler.cancel()
+        self._handler = None
+
+
 # Main control of buffer instances - creating buffer instances
 class BufferControl(HassBasicApp):
     @boot_logger_off
@@ -46,18 +436,145 @@ class BufferControl(HassBasicApp):
         self.instance: dict[str, BufferInstanceABC] = {}
         # Registered
         self.register: TaskBaseList = []
+        # (instance name, task name): task and tasks of instance, see add_task
+        self._task_index: Dict[Tuple[str, str], TaskBaseABC] = {}
+        self._instance_tasks: Dict[str, TaskBaseList] = {}
+        self.loop_scheduler = LoopScheduler(self)
+        self.bus = EventBus(self, self.args.get("mirror_events", MIRROR_EVENTS))
+        self.state_dispatcher = StateChangeDispatcher(
+            self, self.args.get("state_coalesce", STATE_COALESCE)
+        )
+        self.metrics_publisher = MetricsPublisher(
+            self, self.args.get("metrics_interval", METRICS_INTERVAL)
+        )
 
     def init(self):
         pass
 
+    def terminate(self):
+        self.info(f"Loop scheduler {self.loop_scheduler.stats}")
+        self.info(f"Queues {self.queue_stats}")
+        self.info(f"Timeouts {self.timeout_stats}")
+        self.info(f"Event bus {self.bus.stats}")
+        self.info(f"State changed {self.state_dispatcher.stats}")
+        self.loop_scheduler.stop()
+        self.metrics_publisher.stop()
+
     def create_new_instance(self, name: str) -> BufferInstanceABC:
-        self.debug(f"Creating new buffer instance: {name}")
-        self.instance[name] = BufferInstance(self, name)
+        self.debug("Creating new buffer instance: %s", name)
+        self.instance[name] = BufferInstance(
+            self,
+            name,
+            max_concurrency=self._instance_arg(
+                "max_concurrency", name, MAX_CONCURRENCY
+            ),
+            max_depth=self._instance_arg("max_depth", name, MAX_DEPTH),
+            overflow=self._instance_arg("overflow", name, REJECT),
+            expectation_timeout=self._instance_arg(
+                "expectation_timeout", name, EXPECTATION_TIMEOUT
+            ),
+            expectation_retries=self._instance_arg(
+                "expectation_retries", name, EXPECTATION_RETRIES
+            ),
+        )
+        self.metrics_publisher.start()
         return self.instance[name]
 
+    def _instance_arg(self, key: str, name: str, default: Any) -> Any:
+        """Value from args, the same for all instances or dict by instance name
+
+        Args:
+            key (str): [description]
+            name (str): instance name
+            default (Any): [description]
+
+        Returns:
+            Any: [description]
+        """
+        value = self.args.get(key, default)
+        if isinstance(value, dict):
+            return value.get(name, default)
+        return value
+
+    @property
+    def queue_stats(self) -> Dict[str, dict]:
+        """Depth, dropped, rejected and enqueue-to-start latency per priority"""
+        return {
+            name: instance.queue_stats  # type: ignore
+            for name, instance in self.instance.items()
+        }
+
+    def metrics_snapshot(self, instance_name: StrType = None) -> Dict[str, dict]:
+        """Metrics of buffer instances - queue wait and execution percentiles,
+        executions per minute, deduplicated and timeouts, summary and per task
+
+        Args:
+            instance_name (StrType, optional): only this instance. Defaults to None.
+
+        Returns:
+            Dict[str, dict]: snapshot by instance name
+        """
+        return {
+            name: instance.metrics.snapshot()  # type: ignore
+            for name, instance in self.instance.items()
+            if instance_name is None or name == instance_name
+        }
+
+    @property
+    def timeout_stats(self) -> Dict[str, int]:
+        """Count of expired timeouts per task, only tasks with timeout"""
+        return {
+            f"{task.buffer_instance_name}/{task.name}": task.timeouts
+            for task in self.register
+            if getattr(task, "timeouts", 0) > 0
+        }
+
     def get_instance(self, name: str) -> BufferInstanceType:
         return self.instance.get(name)
 
+    def add_task(self, task_obj: TaskBaseABC):
+        """Appending in register and indexes, buffer_instance_name must be set
+
+        Args:
+            task_obj (TaskBaseABC): [description]
+        """
+        self.register.append(task_obj)
+        instance_name = str(task_obj.buffer_instance_name)
+        # the first registered is found as in searching of register
+        self._task_index.setdefault((instance_name, task_obj.name), task_obj)
+        self._instance_tasks.setdefault(instance_name, []).append(task_obj)
+        self.state_dispatcher.add(task_obj)
+
+    def remove_task(self, task_obj: TaskBaseABC):
+        """Removing from register and indexes - e.g. terminating app
+
+        Args:
+            task_obj (TaskBaseABC): [description]
+        """
+        if task_obj not in self.register:
+            return
+        self.register.remove(task_obj)
+        instance_name = str(task_obj.buffer_instance_name)
+        tasks = self._instance_tasks.get(instance_name, [])
+        if task_obj in tasks:
+            tasks.remove(task_obj)
+        key = (instance_name, task_obj.name)
+        if self._task_index.get(key) is task_obj:
+            del self._task_index[key]
+            # the next registered with the same name
+            for other in tasks:
+                if other.name == task_obj.name:
+                    self._task_index[key] = other
+                    break
+        self.state_dispatcher.remove(task_obj)
+        self.loop_scheduler.remove(task_obj)  # type: ignore
+
+    def get_task(self, instance_name: str, name: str) -> TaskBaseType:
+        return self._task_index.get((instance_name, name))
+
+    def get_instance_tasks(self, instance_name: str) -> TaskBaseList:
+        return list(self._instance_tasks.get(instance_name, []))
+
 
 BufferControlType = Union[BufferControl, None]
 
@@ -77,7 +594,7 @@ class BufferInterface(BufferInterfaceABC):
         Args:
             instance_name (InstanceNameType, optional): [description]. Defaults to None.
         """
-        self.debug(f"Buffer instance init: {instance_name}")
+        self.debug("Buffer instance init: %s", instance_name)
         buffer_control: BufferControlType = self.sync_get_app("buffer_control")
         assert (
             buffer_control is not None
@@ -98,11 +615,7 @@ class BufferInterface(BufferInterfaceABC):
             TaskBaseList: [description]
         """
         s_instance_name: str = self.get_instance_name(instance_name)
-        retval: TaskBaseList = []
-        for task_obj in self.buffer_control.register:
-            if task_obj.buffer_instance_name == s_instance_name:
-                retval.append(task_obj)
-        return retval
+        return self.buffer_control.get_instance_tasks(s_instance_name)
 
     def get_buffer_instance(self, instance_name: InstanceNameType = None):
         s_instance_name = self.get_instance_name(instance_name)
@@ -111,7 +624,7 @@ class BufferInterface(BufferInterfaceABC):
     def define_buffer_instance(
         self, instance_name: InstanceNameType
     ) -> BufferInstanceABC:
-        self.debug(f"Defining buffer instance with name: {instance_name}")
+        self.debug("Defining buffer instance with name: %s", instance_name)
         s_instance_name = self.get_instance_name(instance_name)
         assert (
             s_instance_name is not None
@@ -123,7 +636,7 @@ class BufferInterface(BufferInterfaceABC):
         if buffer_instance is None:
             self.debug("Define buffer")
             assert self.buffer_control is not None, "Buffer control is none"
-            self.debug(f"Create new instance: buffer_instance {buffer_instance}")
+            self.debug("Create new instance: buffer_instance %s", buffer_instance)
 
             buffer_instance = self.buffer_control.create_new_instance(s_instance_name)
         assert (
@@ -167,27 +680,40 @@ class BufferInterface(BufferInterfaceABC):
             instance_name (InstanceNameType, optional): [description]. Defaults to None.
         """
         assert len(task_obj.name) > 0, "Fatal error in registering task. Name not found"
-        self.debug(f"Registering task: {task_obj.name}")
+        self.debug("Registering task: %s", task_obj.name)
 
         s_instance_name: str = self.get_instance_name(instance_name)
         self.debug(
-            f"s instance name: {s_instance_name} task obj instance name (normally None) {task_obj.buffer_instance_name}"
+            "s instance name: %s task obj instance name (normally None) %s",
+            s_instance_name,
+            task_obj.buffer_instance_name,
         )
         if instance_name is None:
             if task_obj.buffer_instance_name is None:
                 task_obj.buffer_instance_name = s_instance_name
             else:
                 s_instance_name = task_obj.buffer_instance_name
-        self.debug(f"Checking buffer {task_obj.buffer_instance_name}")
+        self.debug("Checking buffer %s", task_obj.buffer_instance_name)
         # buffer_instance: BufferInstance = self.define_buffer_instance(s_instance_name)
         self.debug(
-            f"To append: {task_obj.name} into instance: {task_obj.buffer_instance_name}"
+            "To append: %s into instance: %s",
+            task_obj.name,
+            task_obj.buffer_instance_name,
         )
 
-        self.debug(f"Setting parent for: {task_obj.name}")
+        self.debug("Setting parent for: %s", task_obj.name)
 
         task_obj.set_parent(self)
-        self.buffer_control.register.append(task_obj)
+        self.buffer_control.add_task(task_obj)
+
+    def unregister_task(self, task_obj: TaskBaseABC):
+        """Counterpart of register_task, task is not found and dispatched anymore
+
+        Args:
+            task_obj (TaskBase): [description]
+        """
+        self.debug("Unregistering task: %s", task_obj.name)
+        self.buffer_control.remove_task(task_obj)
 
     def _get_task_name(self, name: TaskNameType) -> str:
         if isinstance(name, Enum):
@@ -199,21 +725,19 @@ class BufferInterface(BufferInterfaceABC):
         self, name: TaskNameType, instance_name: InstanceNameType = None
     ) -> TaskBaseType:
         s_name: str = self._get_task_name(name)
-        task_obj_list: TaskBaseList = self.get_registered_tasks(instance_name)
 
         # Very important it is searching throw name
-        retval: TaskBaseType = next(
-            (task_obj for task_obj in task_obj_list if task_obj.name == s_name),
-            None,
+        retval: TaskBaseType = self.buffer_control.get_task(
+            self.get_instance_name(instance_name), s_name
         )
-        self.debug(f"Found task: {retval}")
+        self.debug("Found task: %s", retval)
         return retval
 
     def _get_task_base(
         self, task_arg: TaskArgType, instance_name: InstanceNameType = None
     ) -> TaskBaseType:
         if isinstance(task_arg, Enum):
-            self.debug(f"get_task: {task_arg} from instance: {instance_name}")
+            self.debug("get_task: %s from instance: %s", task_arg, instance_name)
             return self._get_task(task_arg, instance_name=instance_name)
         elif isinstance(task_arg, TaskBaseABC):
             return task_arg
@@ -224,10 +748,10 @@ class BufferInterface(BufferInterfaceABC):
         arg: Any = None,
         instance_name: InstanceNameType = None,
     ):
-        self.debug(f"Put in queue {task_arg} arg: {arg}")
+        self.debug("Put in queue %s arg: %s", task_arg, arg)
         s_instance_name: str = self.get_instance_name(instance_name)
 
-        self.debug(f"Found {task_arg} in instance: {s_instance_name}")
+        self.debug("Found %s in instance: %s", task_arg, s_instance_name)
 
         task_param: TaskParamType = None
         task_obj: TaskBaseType = None
@@ -235,7 +759,9 @@ class BufferInterface(BufferInterfaceABC):
             self.debug("It is instance of TaskParam")
             task_param = task_arg
         else:
-            self.debug(f"The first get task: {task_arg} in instance: {s_instance_name}")
+            self.debug(
+                "The first get task: %s in instance: %s", task_arg, s_instance_name
+            )
             task_obj = self._get_task_base(task_arg, s_instance_name)
             if task_obj is None:
                 self.warning(
@@ -252,7 +778,7 @@ class BufferInterface(BufferInterfaceABC):
             return
         if task_obj.buffer_instance_name is None and s_instance_name is not None:
             task_obj.buffer_instance_name = s_instance_name
-        self.debug(f"Task obj instance name: {task_obj.buffer_instance_name}")
+        self.debug("Task obj instance name: %s", task_obj.buffer_instance_name)
         assert task_obj.buffer_instance_name is not None
 
         buffer_instance: BufferInstanceType = self.get_buffer_instance(task_obj)
@@ -262,7 +788,10 @@ class BufferInterface(BufferInterfaceABC):
             buffer_instance is not None
         ), f"Buffer instance is None in getting: {task_obj}"
         self.debug(
-            f"Putting in queue {task_param.name}, buffer_instance: {buffer_instance.module_name}, waiting: {buffer_instance.waiting}"
+            "Putting in queue %s, buffer_instance: %s, waiting: %s",
+            task_param.name,
+            buffer_instance.module_name,
+            buffer_instance.waiting,
         )
         await buffer_instance.put_in_queue(task=task_param)
 
@@ -295,9 +824,13 @@ class BufferInterface(BufferInterfaceABC):
         assert buffer_instance is not None, "Buffer instance is None in task_done"
         assert task_base_obj is not None, "task_base_obj is None in task_done"
         self.debug(
-            f"Task: {task_base_obj.name} done with auto_done: {task_base_obj.auto_done}"
+            "Task: %s done with auto_done: %s",
+            task_base_obj.name,
+            task_base_obj.auto_done,
+        )
+        await buffer_instance.execution_finished(
+            buffer_instance.waiting.get(task_base_obj.name)
         )
-        await buffer_instance.execution_finished()
 
     async def start_tasks_buffer(self, buffer_instance: StrType = None):
         self.debug("Start tasks")
@@ -342,7 +875,7 @@ class BufferInterface(BufferInterfaceABC):
             instance = self.define_buffer_instance(instance_name)
         assert instance is not None, "Not possible to define instance"
 
-        self.debug(f"instance start {instance}")
+        self.debug("instance start %s", instance)
         await instance.start(
             state_function=state_function,
             state_command=state_command,
@@ -1,7 +1,11 @@
-from asyncio.queues import Queue
+import asyncio
+from asyncio.queues import PriorityQueue
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, List, NoReturn, Union
+import heapq
+import itertools
+import time
+from typing import Any, Dict, Iterator, List, NoReturn, Union
 from apd_types import (
     BufferInstanceABC,
     StateFunctionABC,
@@ -11,13 +15,77 @@ from apd_types import (
     TaskLoopABC,
     TaskParamType,
 )
+from buffer_metrics import InstanceMetrics
 from globals_def import GEVNT
 from helper_tools import MyHelp as h
 
-from globals import BUFFER_EVENT, OFF, ON, TASK_EVENT
+from globals import BUFFER_EVENT, OFF, ON, TASK_EVENT, TASK_PRIORITY
 from helper_types import EnumType
 from task_register import TaskBtn, TaskParam
 
+MAX_DEPTH = 0  # maximum tasks in queue for background tasks, 0 - unbounded
+MAX_CONCURRENCY = 1  # workers of main_loop executing tasks in parallel
+EXPECTATION_TIMEOUT = 10  # seconds without change of state before state command again
+EXPECTATION_RETRIES = 0  # state commands before giving up expectation, 0 - unlimited
+# Overflow policy of full queue, interactive and normal tasks are always put
+# Tasks with the same name are never twice in queue - put_in_queue coalesces them
+REJECT = "reject"  # new background task is rejected, loop will come again
+DROP_OLDEST = "drop_oldest"  # oldest background task is removed from queue
+
+
+class TaskQueue(PriorityQueue):
+    """Items (priority, seq, TaskParam) - lower priority first, then FIFO"""
+
+    def drop_oldest(self, priority: int) -> TaskParamType:
+        """Removes the oldest task with lowest priority, at least priority
+
+        Linear scan and heapify - O(n), acceptable only for small max_depth
+
+        Args:
+            priority (int): TASK_PRIORITY
+
+        Returns:
+            TaskParamType: removed or None
+        """
+        queue: list = self._queue  # type: ignore
+        candidates = [item for item in queue if item[0] >= priority]
+        if not candidates:
+            return None
+        item = min(candidates, key=lambda item: (-item[0], item[1]))
+        queue.remove(item)
+        heapq.heapify(queue)
+        self.task_done()
+        return item[2]
+
+
+@dataclass
+class LatencyStat:
+    """Enqueue-to-start latency in seconds"""
+
+    count: int = 0
+    total: float = 0
+    max: float = 0
+    last: float = 0
+
+    def add(self, latency: float):
+        self.count += 1
+        self.total += latency
+        self.last = latency
+        if latency > self.max:
+            self.max = latency
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def as_dict(self) -> dict:
+        return dict(
+            count=self.count,
+            avg=round(self.avg, 4),
+            max=round(self.max, 4),
+            last=round(self.last, 4),
+        )
+
 
 # It is parent of BufferControl
 # This class is not parent of BufferInterface
@@ -38,6 +106,21 @@ class BufferInstance(BufferInstanceABC):
 
     _exception_loop_handler: Any = None
     _to_check: str = field(default=OFF)
+    expectation_timeout: float = field(default=EXPECTATION_TIMEOUT)
+    expectation_retries: int = field(default=EXPECTATION_RETRIES)
+    # created in start_tasks
+    _expectation_started: Any = None  # asyncio.Event - exception_loop wakes up
+    _no_expectation: Any = None  # asyncio.Event - workers are running
+    _expectation_changed: Any = None  # asyncio.Event - state to be checked again
+
+    max_concurrency: int = field(default=MAX_CONCURRENCY)
+    max_depth: int = field(default=MAX_DEPTH)
+    overflow: str = field(default=REJECT)
+    dropped: int = field(default=0)  # removed by DROP_OLDEST
+    rejected: int = field(default=0)  # not put in full queue
+    _seq: Iterator[int] = field(default_factory=itertools.count)
+    _latency: Dict[int, LatencyStat] = field(default_factory=dict)
+    metrics: InstanceMetrics = field(default_factory=InstanceMetrics)
 
     async def start(
         self,
@@ -47,27 +130,31 @@ class BufferInstance(BufferInstanceABC):
         if self._asking_tasks:
             self.warning(f"Already asked asks {self.module_name}")
             return
-        self.debug(f"Go start with state function {state_function}")
+        self.debug("Go start with state function %s", state_function)
         if state_function is not None:
             self.state_command = state_command
             tasks: TaskBaseList = self.get_registered_tasks()
             for task in tasks:
                 if isinstance(task, TaskCoroABC):
-                    self.debug(f"Assigning state function to {task.name}")
+                    self.debug("Assigning state function to %s", task.name)
                     task.set_state_function(state_function)
         await self.start_tasks()
 
     async def start_tasks(self):
-        self.debug(f"start tasks with control task")
+        self.debug("start tasks with control task")
         if self._asking_tasks or self.main_loop_started:
             self.warning(f"Already asked asks {self.module_name}")
             return
 
-        self._command_buffer: Queue = Queue()
+        self._command_buffer: TaskQueue = TaskQueue()
+        self._expectation_started = asyncio.Event()
+        self._no_expectation = asyncio.Event()
+        self._expectation_changed = asyncio.Event()
+        self.expection_task_active = self.expection_task
         self.debug("Create task")
         self.task_main_loop = await self.create_task(self.main_loop())
         # await self._ba.create_task(self.watchdog())
-        self.debug(f" Create task for expection: {self.state_command is not None}")
+        self.debug(" Create task for expection: %s", self.state_command is not None)
         if self.state_command is not None and self._exception_loop_handler is None:
             self._exception_loop_handler = await self.create_task(self.exception_loop())
         index: int = 0
@@ -80,54 +167,80 @@ class BufferInstance(BufferInstanceABC):
     async def join(self):
         await self._command_buffer.join()
 
+    async def fire_event(self, event, **kwargs):
+        """Framework event - in-process bus of BufferControl"""
+        await self._ba.bus.fire(event, **kwargs)  # type: ignore
+
     async def clear_queue(self):
         self.debug("Clearing queue!")
-        self.expection_task = None
+        self.expection_task_active = None
         await self.fire_event(GEVNT.BUFFER_CLEARED.value)
-        while True:
-            try:
-                self._command_buffer.get_nowait()
-                self._command_buffer.task_done()
-            except:
-                pass
-            try:
-                self.waiting.clear()
-                self._queue.clear()
-                self.debug("Clear done")
-                if self.task_main_loop is not None:
-                    self.task_main_loop.cancel()
-            except:
-                pass
-            self.task_main_loop = await self.create_task(self.main_loop())
-            return
+        while not self._command_buffer.empty():
+            self._command_buffer.get_nowait()
+            self._command_buffer.task_done()
+        try:
+            self.waiting.clear()
+            self._queue.clear()
+            self.debug("Clear done")
+            if self.task_main_loop is not None:
+                self.task_main_loop.cancel()
+        except:
+            pass
+        # workers are cancelled with main_loop, new ones are started
+        self.main_loop_started = False
+        self.task_main_loop = await self.create_task(self.main_loop())
+
+    async def _main_process(self, worker: bool = False) -> TaskParamType:
+        """Executing of one task from queue
 
-    async def _main_process(self) -> TaskParamType:
+        Args:
+            worker (bool, optional): called from main_loop worker, task is returned
+                in queue when expectation is active. Defaults to False.
+
+        Returns:
+            TaskParamType: executed task
+        """
         retval: TaskParamType = None
         try:
-            self.debug(f"Main process {self.module_name} - waiting")
-            self.curent_task_param = await self._command_buffer.get()
-            if self.curent_task_param is None:
+            self.debug("Main process %s - waiting", self.module_name)
+            item = await self._command_buffer.get()
+            task_param = item[2]
+            if task_param is None:
                 self.error("Fatal error getting task")
                 self._command_buffer.task_done()
                 return None
+            if worker and self.expection_task is not None:
+                # exception_loop is waiting for state command
+                self._command_buffer.put_nowait(item)
+                self._command_buffer.task_done()
+                return None
             self.debug("_main_process")
             assert isinstance(
-                self.curent_task_param, TaskParam
+                task_param, TaskParam
             ), "Instance in main buffer is not TaskParam"
-
-            self.debug(f"Received: {self.curent_task_param.name} {self.module_name}")
-
-            await self.curent_task_param.execute()
+            self.curent_task_param = task_param
+
+            self.debug("Received: %s %s", task_param.name, self.module_name)
+            started = time.monotonic()
+            wait = started - task_param.enqueued
+            self._latency.setdefault(task_param.priority, LatencyStat()).add(wait)
+            self.metrics.started(task_param.name, wait)
+
+            await task_param.execute()
+            self.metrics.finished(
+                task_param.name,
+                time.monotonic() - started,
+                getattr(task_param.task, "time_overflow", False),
+            )
             assert (
-                self.curent_task_param.task is not None
-            ), "self.curent_task_param.task is None in _main_process"
+                task_param.task is not None
+            ), "task_param.task is None in _main_process"
             self.debug(
-                f"Is auto_done: {self.curent_task_param.task.auto_done} for: {self.curent_task_param.name}"
+                "Is auto_done: %s for: %s", task_param.task.auto_done, task_param.name
             )
-            if self.curent_task_param.task.auto_done:
-                retval = await self.execution_finished()
-            else:
-                retval = self.curent_task_param
+            if task_param.task.auto_done:
+                await self.execution_finished(task_param)
+            retval = task_param
         except Exception as ex:
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
             message = template.format(type(ex).__name__, ex.args)
@@ -136,25 +249,37 @@ class BufferInstance(BufferInstanceABC):
         self.debug("_main process finished")
         return retval
 
-    async def execution_finished(self) -> TaskParamType:
-        self.debug(f"Execution finished")
-        self.debug(f"Was waiting: {self.waiting}")
+    async def execution_finished(
+        self, task_param: TaskParamType = None
+    ) -> TaskParamType:
+        """Task is removed from waiting, queue is released once per task
 
-        assert self.curent_task_param is not None, "Wrong definition current task"
-        self.debug(f"Current task param name: {self.curent_task_param.name}")
+        Args:
+            task_param (TaskParamType): None or task already finished (e.g.
+                task_done after timeout) - nothing is done
 
-        # safety removing
-        h.remove_key(self.waiting, self.curent_task_param.name)
-        h.remove_key(self._queue, self.curent_task_param.name)
+        Returns:
+            TaskParamType: finished task or None
+        """
+        self.debug("Execution finished")
+        self.debug("Was waiting: %s", self.waiting)
 
-        self.debug(f"Is waiting: {self.waiting} task done, trying to done")
+        if task_param is None or self.waiting.get(task_param.name) is not task_param:
+            self.debug("Task is not waiting: %s", task_param)
+            return None
+        self.debug("Current task param name: %s", task_param.name)
+
+        h.remove_key(self.waiting, task_param.name)
+        h.remove_key(self._queue, task_param.name)
+
+        self.debug("Is waiting: %s task done, trying to done", self.waiting)
         try:
             self._command_buffer.task_done()
-            self.debug(f"Done with size: {self._command_buffer.qsize()}")
+            self.debug("Done with size: %s", self._command_buffer.qsize())
         except:
             pass
 
-        return self.curent_task_param
+        return task_param
 
     @property
     def expection_task_active(self) -> bool:
@@ -163,55 +288,109 @@ class BufferInstance(BufferInstanceABC):
     @expection_task_active.setter
     def expection_task_active(self, value):
         self.expection_task = value
+        if self._no_expectation is None:
+            return
+        if value is None:
+            self._no_expectation.set()
+        else:
+            self._no_expectation.clear()
+            self._expectation_changed.clear()
+            self._expectation_started.set()
+
+    async def _expectation_event(self, event, data, kwargs):
+        self._expectation_changed.set()
+
+    async def _expectation_state(self, entity, attribute, old, new, kwargs):
+        if old != new:
+            self._expectation_changed.set()
+
+    async def _listen_expectation(self) -> list:
+        """Change of input_boolean or state function is waking up exception_loop
+
+        Returns:
+            list: handles of listen_state
+        """
+        assert self.expection_task is not None
+        input_boolean = self.expection_task.input_boolean
+        if not input_boolean:
+            return []
+        if isinstance(input_boolean, str):
+            input_boolean = (input_boolean,)
+        return [
+            await self._ba.listen_state(self._expectation_state, entity_id)
+            for entity_id in input_boolean
+        ]
+
+    async def _expectation_fulfilled(self) -> bool:
+        assert self.expection_task is not None
+        self.debug("To check: '%s''", self._to_check)
+        self.debug("Expection task name: %s", self.expection_task.name)
+        if self._to_check == ON and self.expection_task.expected_on is not None:
+            self.debug("For on: %s", self.expection_task.expected_on)
+            return bool(
+                await self.expection_task.call_fce(self.expection_task.expected_on)
+            )
+        elif self.expection_task.expected_off is not None:
+            self.debug("For off: %s", self.expection_task.expected_off)
+            return bool(
+                await self.expection_task.call_fce(self.expection_task.expected_off)
+            )
+        self.error("self._expection_task is None!")
+        return False
 
     async def exception_loop(self) -> NoReturn:
         # in exceptance is waiting for state_command
         self.debug("Exception loop in buffer started")
+        await self._ba.listen_event(
+            self._expectation_event, GEVNT.BUFFER_INSTANCE_STATE_CHANGED.value
+        )
         while True:
+            await self._expectation_started.wait()
+            self._expectation_started.clear()
             if self.expection_task is None:
-                # self.debug("Exception loop is not active")
-                await self.sleep(5)
                 continue
 
             # waiting for the task
-            self.debug(f">>>>>>>>Waiting in buffer exception {self.waiting}")
+            self.debug(">>>>>>>>Waiting in buffer exception %s", self.waiting)
             await self.fire_event(BUFFER_EVENT.WAITING_ON.value)
-
-            # Waiting for expected state
+            handles: list = []
             try:
+                handles = await self._listen_expectation()
+                # state command put in queue by main_loop
                 await self._main_process()
-
-                self.debug(f"After main_process to check: '{self._to_check}''")
-                self.debug(f"Expection task name: {self.expection_task.name}")
-
-                if self._to_check == ON and self.expection_task.expected_on is not None:
-                    self.debug(f"For on: {self.expection_task.expected_on}")
-                    if await self.expection_task.call_fce(
-                        self.expection_task.expected_on
-                    ):
-                        self.debug("have what expected")
-                        self.expection_task = None
-                        await self.fire_event(BUFFER_EVENT.WAITING_OFF.value)
-                elif self.expection_task.expected_off is not None:
-                    self.debug(f"For off: {self.expection_task.expected_off}")
-                    if await self.expection_task.call_fce(
-                        self.expection_task.expected_off
-                    ):
-                        await self.fire_event(BUFFER_EVENT.WAITING_OFF.value)
-                        self.debug("have what expected")
-                        self.expection_task = None
+                retries = 0
+                while not await self._expectation_fulfilled():
+                    try:
+                        await asyncio.wait_for(
+                            self._expectation_changed.wait(), self.expectation_timeout
+                        )
+                        self._expectation_changed.clear()
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+                    retries += 1
+                    if 0 < self.expectation_retries < retries:
+                        self.error(
+                            f"Expectation of {self.expection_task.name} not fulfilled"
+                        )
+                        break
+                    self.warning(
+                        f"Exception is active {self.expectation_timeout} s, state command again"
+                    )
+                    await self.put_in_queue(self.state_command)
+                    await self._main_process()
                 else:
-                    self.error("self._expection_task is None!")
+                    self.debug("have what expected")
             except Exception as ex:
                 template = "An exception of type {0} occurred. Arguments:\n{1!r}"
                 message = template.format(type(ex).__name__, ex.args)
                 self.error(message)
                 raise ValueError("Fatal error in core")
-
-            if self.expection_task is not None:
-                self.warning("Exception is active waiting 10 seconds for state command")
-                await self.sleep(10)
-                await self.put_in_queue(self.state_command)
+            finally:
+                for handle in handles:
+                    await self._ba.cancel_listen_state(handle)
+            self.expection_task_active = None
+            await self.fire_event(BUFFER_EVENT.WAITING_OFF.value)
 
     async def main_loop(self):
         """Checking and providing future tasks based on queue"""
@@ -224,22 +403,28 @@ class BufferInstance(BufferInstanceABC):
         await self.fire_event(
             TASK_EVENT.BUFFER_STARTED.value, instance=self.module_name
         )
+        # Tasks with the same name are not running together - waiting
+        await asyncio.gather(
+            *(self._worker() for _ in range(max(1, self.max_concurrency)))
+        )
 
+    async def _worker(self) -> NoReturn:
         while True:
             if self.expection_task:
                 self.debug("Exception is active ")
-                await self.sleep(5)
+                await self._no_expectation.wait()
                 continue
-            self.debug(f"Waiting in buffer main_loop {self.waiting}")
+            self.debug("Waiting in buffer main_loop %s", self.waiting)
 
             if len(self.waiting) == 0:
                 await self.fire_event(BUFFER_EVENT.WAITING_OFF.value)
             # Main process
-            task_param = await self._main_process()
+            task_param = await self._main_process(worker=True)
 
-            self.debug(f"After main process: {task_param}")
+            self.debug("After main process: %s", task_param)
             if task_param is None:
-                self.warning("Task param is None")
+                if not self.expection_task:
+                    self.warning("Task param is None")
                 continue
             if not isinstance(task_param.task, TaskBtn):
                 continue
@@ -266,45 +451,86 @@ class BufferInstance(BufferInstanceABC):
     async def put_in_queue(self, task: Union[TaskParam, EnumType]):
         if not self.main_loop_started:
             self.debug(
-                f"Buffer instance was not started name: {self.module_name} {self.main_loop_started}"
+                "Buffer instance was not started name: %s %s",
+                self.module_name,
+                self.main_loop_started,
             )
             await self.start_tasks()
         if isinstance(task, TaskParam):
             task_param = task
         else:
             assert task is not None, "Task can not be None for putting in queue"
-            task_obj: Union[TaskBaseABC, None] = None
-            for task_obj in self.register():
-                assert task_obj is not None, "None in register"
-                if (
-                    task_obj.buffer_instance_name == self.module_name
-                    and task_obj.name == task.value
-                ):
-                    break
+            task_obj: Union[TaskBaseABC, None] = self._ba.get_task(  # type: ignore
+                self.module_name, task.value
+            )
             assert task_obj is not None, f"Not registered: {task.value}"
             task_param = TaskParam(task=task_obj, name=task_obj.name)
 
         if task_param.name in self.waiting.keys():
-            self.debug(f"{task_param.name} is waiting")
+            self.debug("%s is waiting", task_param.name)
+            self.metrics.deduplicated(task_param.name)
             return False
 
+        if task_param.task is not None:
+            task_param.priority = task_param.task.priority  # type: ignore
+        assert self._command_buffer is not None, "Not initialized _buffer_command"
+        if 0 < self.max_depth <= self._command_buffer.qsize():
+            if not self._overflow(task_param):
+                return False
+
         task_param.in_buffer = await self._ba.now()
+        task_param.enqueued = time.monotonic()
         self.waiting[task_param.name] = task_param
 
         self._queue.append(task_param.name)
-        assert self._command_buffer is not None, "Not initialized _buffer_command"
-        await self._command_buffer.put(task_param)
+        await self._command_buffer.put(
+            (task_param.priority, next(self._seq), task_param)
+        )
         self.debug(
-            f"Task in queue: {task_param.name} param: {task_param.arg} {task_param.task}"
+            "Task in queue: %s param: %s %s",
+            task_param.name,
+            task_param.arg,
+            task_param.task,
+        )
+
+    def _overflow(self, task_param: TaskParam) -> bool:
+        """Queue is full - max_depth bounds background tasks only
+
+        Args:
+            task_param (TaskParam): to put in queue
+
+        Returns:
+            bool: True if task_param can be put in queue
+        """
+        if self.overflow == DROP_OLDEST:
+            dropped = self._command_buffer.drop_oldest(TASK_PRIORITY.BACKGROUND)
+            if dropped is not None:
+                h.remove_key(self.waiting, dropped.name)
+                h.remove_key(self._queue, dropped.name)
+                self.dropped += 1
+                self.warning(f"Queue full, dropped: {dropped.name}")
+                return True
+        if task_param.priority < TASK_PRIORITY.BACKGROUND:
+            # interactive and normal tasks are not lost
+            return True
+        self.rejected += 1
+        self.debug("Queue full, rejected: %s", task_param.name)
+        return False
+
+    @property
+    def queue_stats(self) -> dict:
+        return dict(
+            depth=self._command_buffer.qsize() if self.main_loop_started else 0,
+            dropped=self.dropped,
+            rejected=self.rejected,
+            latency={
+                TASK_PRIORITY(priority).name.lower(): stat.as_dict()
+                for priority, stat in sorted(self._latency.items())
+            },
         )
 
     def get_registered_tasks(self) -> TaskBaseList:
-        retval: TaskBaseList = []
-        task_obj: TaskBaseABC
-        for task_obj in self.register():
-            if task_obj.buffer_instance_name == self.module_name:
-                retval.append(task_obj)
-        return retval
+        return self._ba.get_instance_tasks(self.module_name)  # type: ignore
 
     async def _control_loops(self, stop: bool):
         self.info(f"Control loops, stop: {stop}")
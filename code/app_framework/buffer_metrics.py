@@ -0,0 +1,131 @@
+""" Metrics of BufferInstance - queue wait, execution time and rates per task
+
+Collected by BufferInstance, published by BufferControl
+"""
+from dataclasses import dataclass, field
+import math
+import random
+import time
+from typing import Dict, List, Union
+
+RESERVOIR_SIZE = 512  # samples kept for percentiles
+RATE_WINDOW = 60  # [s] window of executions per minute, one slot per second
+PERCENTILES = (50, 95, 99)
+
+_random = random.Random()
+
+
+@dataclass
+class Reservoir:
+    """Uniform sample of values (reservoir sampling), memory is constant"""
+
+    size: int = RESERVOIR_SIZE
+    count: int = 0
+    max: float = 0
+    samples: List[float] = field(default_factory=list)
+
+    def add(self, value: float):
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+            return
+        i = _random.randrange(self.count)
+        if i < self.size:
+            self.samples[i] = value
+
+    def percentiles(self) -> Dict[str, float]:
+        """p50, p95, p99 - sorting only when asked"""
+        if not self.samples:
+            return {f"p{p}": 0 for p in PERCENTILES}
+        ordered = sorted(self.samples)
+        # nearest rank
+        return {
+            f"p{p}": round(ordered[max(math.ceil(len(ordered) * p / 100) - 1, 0)], 4)
+            for p in PERCENTILES
+        }
+
+
+@dataclass
+class RateCounter:
+    """Events in last RATE_WINDOW seconds"""
+
+    _slots: List[int] = field(default_factory=lambda: [0] * RATE_WINDOW)
+    _seconds: List[int] = field(default_factory=lambda: [-1] * RATE_WINDOW)
+
+    def add(self, now: Union[float, None] = None):
+        second = int(time.monotonic() if now is None else now)
+        i = second % RATE_WINDOW
+        if self._seconds[i] != second:
+            self._seconds[i] = second
+            self._slots[i] = 0
+        self._slots[i] += 1
+
+    def per_minute(self, now: Union[float, None] = None) -> float:
+        second = int(time.monotonic() if now is None else now)
+        count = sum(
+            slot
+            for slot, slot_second in zip(self._slots, self._seconds)
+            if second - slot_second < RATE_WINDOW
+        )
+        return round(count * 60 / RATE_WINDOW, 1)
+
+
+@dataclass
+class TaskMetrics:
+    wait: Reservoir = field(default_factory=Reservoir)  # enqueue to start [s]
+    execution: Reservoir = field(default_factory=Reservoir)  # [s]
+    rate: RateCounter = field(default_factory=RateCounter)
+    deduplicated: int = 0  # not put in queue, already waiting
+    timeouts: int = 0
+
+    def as_dict(self) -> dict:
+        retval = dict(
+            executions=self.execution.count,
+            per_minute=self.rate.per_minute(),
+            deduplicated=self.deduplicated,
+            timeouts=self.timeouts,
+        )
+        for name, stat in (("wait", self.wait), ("execution", self.execution)):
+            for key, value in stat.percentiles().items():
+                retval[f"{name}_{key}"] = value
+            retval[f"{name}_max"] = round(stat.max, 4)
+        return retval
+
+
+@dataclass
+class InstanceMetrics:
+    """Metrics of one BufferInstance, summary and per task"""
+
+    total: TaskMetrics = field(default_factory=TaskMetrics)
+    tasks: Dict[str, TaskMetrics] = field(default_factory=dict)
+
+    def _task(self, name: str) -> TaskMetrics:
+        metrics = self.tasks.get(name)
+        if metrics is None:
+            metrics = self.tasks[name] = TaskMetrics()
+        return metrics
+
+    def started(self, name: str, wait: float):
+        self.total.wait.add(wait)
+        self._task(name).wait.add(wait)
+
+    def finished(self, name: str, execution: float, timeout: bool = False):
+        now = time.monotonic()
+        for metrics in (self.total, self._task(name)):
+            metrics.execution.add(execution)
+            metrics.rate.add(now)
+            if timeout:
+                metrics.timeouts += 1
+
+    def deduplicated(self, name: str):
+        self.total.deduplicated += 1
+        self._task(name).deduplicated += 1
+
+    def snapshot(self) -> dict:
+        retval = self.total.as_dict()
+        retval["tasks"] = {
+            name: metrics.as_dict() for name, metrics in sorted(self.tasks.items())
+        }
+        return retval
@@ -14,6 +14,7 @@ from entity_oper import CmdToDo, EntityObject, EntityOper, EntityOperType
 
 from globals import HELPERS, OFF
 import globals as g
+from globals_def import eventsDef as e
 from helper_tools import INDEX_KEY, MyHelp as h, STORED
 from sensors import Sensors
 import inspect
@@ -54,19 +55,10 @@ class CreateHelpers(HassBasicAppSensors):
         ###
         # Loop
         await h.async_stored_walk(self._to_create_objects, g.helper_register)
-        waiting: bool = len(g.created_helpers_obj) > 1
-        eo: EntityObject
         self.info("Waiting to create!")
-        while waiting:
-            waiting = False
-            for eo in g.created_helpers_obj:
-                if eo.cmd is None:
-                    raise ValueError(f"Found without cmd {eo.entity_id}")
-                if not eo.cmd_finished:
-                    waiting = True
-                    self.debug(f"Wait for {eo.entity_id}")
-                    await self.sleep(1)
-                    break
+        await self.entity_oper.register_batch(g.created_helpers_obj)
+        # LastMile is following persisted helpers
+        await self.fire_event(e.HELPERS_CHANGED)
         buffer_control.task_done()
         await self.run_in_executor(self._create_sensors)
         self.debug("Sensors updated")
@@ -104,8 +96,8 @@ class CreateHelpers(HassBasicAppSensors):
             if eo.domain in HELPERS:
                 h.stored_replace(entity_id, g.helper_register_obj, eo)
                 if new_one and eo.cmd_to_do == CmdToDo.CREATE:
+                    # created all together in execute
                     g.created_helpers_obj.append(eo)
-                    await self.entity_oper.register(eo)
                 else:
                     # self.debug(f"reject: {entity_id}")
                     pass
@@ -4,6 +4,7 @@ import hassapi as hass  # type:ignore
 from functools import wraps
 from helper_tools import MyHelp as h
 import asyncio
+import logging
 
 debug_allowed = []  # name of modules where is debug allowed
 
@@ -25,6 +26,7 @@ def apf_logger(func):
             hass.error = hass.logger.error
             hass.warning = hass.logger.warning
             hass.info = hass.logger.info
+            hass.debug_on = log.isEnabledFor(logging.DEBUG)
         return func(hass)
 
     return wrapper
@@ -1,8 +1,10 @@
 # Device interface used for controlling valves
+import asyncio
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterable, List, Union
 from apd_types import ChildObjectBasicApp
 from global_topeni import SWITCH_KOTEL, TOPENI_RUCNE
 from helper_tools import MyHelp as h, DateTimeOp as dt
@@ -18,6 +20,7 @@ from globals import ON, OFF
 
 
 LIMIT_FOR_SWITCH_MODE = 3 * 60
+STAT_FULL_PUBLISH = 10 * 60  # [s] all stat attributes are sent again (HA restart)
 
 
 class HEAT_PAR(AutoName):
@@ -74,9 +77,15 @@ ApiEntityABCType = Union[ApiEntityABC, None]
 ListApiEntity = List[ApiEntityABC]
 
 
+# keys of DeviceRegister.indexes - searching order in get_entity
+INDEXED_PARAMS = ("device_id", "entity_id", "name_id")
+
+
 class DeviceRegister:
     entities_type: Dict[str, ListApiEntity] = {}
     entities: ListApiEntity = []
+    # interface: param: value: first registered entity
+    indexes: Dict[str, Dict[str, Dict[str, ApiEntityABC]]] = {}
 
     @staticmethod
     def register(parent, entity: ApiEntityABC):
@@ -97,6 +106,13 @@ class DeviceRegister:
         get_list.append(entity)
         DeviceRegister.entities_type[device_type] = get_list
 
+        indexes = DeviceRegister.indexes.setdefault(
+            device_type, {param: {} for param in INDEXED_PARAMS}
+        )
+        for param in INDEXED_PARAMS:
+            # as linear search - first registered wins
+            indexes[param].setdefault(entity.__dict__.get(param, ""), entity)
+
     @staticmethod
     def get_interface_entities(interface_type: INTERFACE_TYPE) -> ListApiEntity:
         if interface_type == INTERFACE_TYPE.UNKNOWN:
@@ -117,29 +133,48 @@ class DeviceRegister:
         device_id: StrType = None,
         interface: INTERFACE_TYPE = INTERFACE_TYPE.UNKNOWN,
     ):
-        def search(register: ListApiEntity, param: str, value: str) -> ApiEntityABCType:
-            return next(
-                (eo for eo in register if eo.__dict__.get(param, "") == value), None
-            )
-
         if entity is not None:
             interface = entity.interface
             name_id = entity.name_id
             device_id = entity.device_id
             entity_id = entity.entity_id
 
-        register = DeviceRegister.get_interface_entities(interface_type=interface)
-        if len(register) == 0:
+        if interface == INTERFACE_TYPE.UNKNOWN:
+            return None
+        indexes = DeviceRegister.indexes.get(str(interface.value))
+        if indexes is None:
             return None
 
         if device_id is not None:
-            return search(register, "device_id", device_id)
+            return indexes["device_id"].get(device_id)
         elif entity_id is not None:
-            return search(register, "entity_id", entity_id)
+            return indexes["entity_id"].get(entity_id)
         elif name_id is not None:
-            return search(register, "name_id", name_id)
+            return indexes["name_id"].get(name_id)
         return None
 
+    @staticmethod
+    def get_entities(
+        device_ids: Iterable[str], interface: INTERFACE_TYPE
+    ) -> Dict[str, ApiEntityABC]:
+        """Entities for whole poll cycle, not registered device_id is missing
+
+        Args:
+            device_ids (Iterable[str]): [description]
+            interface (INTERFACE_TYPE): [description]
+
+        Returns:
+            Dict[str, ApiEntityABC]: device_id: entity
+        """
+        if interface == INTERFACE_TYPE.UNKNOWN:
+            return {}
+        index = DeviceRegister.indexes.get(str(interface.value), {}).get(
+            "device_id", {}
+        )
+        return {
+            device_id: index[device_id] for device_id in device_ids if device_id in index
+        }
+
 
 ApiEntityABCType = Union[ApiEntityABC, None]
 
@@ -211,6 +246,9 @@ class VentilABC(ChildObjectBasicApp, ApiEntityABC):
     last_changed_operation_state: float = field(default=0)
     target_reached: float = field(default=0)
     boiler_excluded: bool = field(default=False)
+    # attributes of stat_id sent last time, only changes are published
+    _published: dict = field(default_factory=dict, repr=False)
+    _published_full: float = field(default=0, repr=False)  # monotonic
 
     def init(self):
         # ChildObjectBasicApp(_ba=self._ba, module_name="Ventil")
@@ -264,11 +302,38 @@ class VentilABC(ChildObjectBasicApp, ApiEntityABC):
         else:
             self.sensor_temperature_ext = False
 
+    def _changed_attributes(self, attr: DictMixed) -> dict:
+        now = time.monotonic()
+        if now - self._published_full > STAT_FULL_PUBLISH:
+            # sensor could be recreated meanwhile without attributes
+            self._published.clear()
+            self._published_full = now
+        return {
+            key: value
+            for key, value in h.get_dict(attr).items()
+            if key not in self._published or self._published[key] != value
+        }
+
+    def _stat_published(self, changed: dict, written: bool):
+        if written:
+            self._published.update(changed)
+        else:
+            # sensor does not exist - everything is sent after recreating
+            self._published.clear()
+
     async def update_sensor_stat(self, attr: DictMixed):
-        await self.set_sensor_state(self.stat_id, "info", attr)
+        changed = self._changed_attributes(attr)
+        if changed:
+            self._stat_published(
+                changed, await self.set_sensor_state(self.stat_id, "info", changed)
+            )
 
     def sync_update_sensor_stat(self, attr: DictMixed):
-        self.sync_set_sensor_state(self.stat_id, "info", attr)
+        changed = self._changed_attributes(attr)
+        if changed:
+            self._stat_published(
+                changed, self.sync_set_sensor_state(self.stat_id, "info", changed)
+            )
 
     async def get_okno_otevrene(self) -> bool:
         # Otevreno - senzor znamena on
@@ -276,29 +341,28 @@ class VentilABC(ChildObjectBasicApp, ApiEntityABC):
         if entity_id is None:
             return False
         if h.is_iterable(entity_id):
-            for e in entity_id:  # type: ignore
-                if await self.is_entity_on(e):
-                    return True
-            return False
+            checks = (self.is_entity_on(e) for e in entity_id)  # type: ignore
+            return any(await asyncio.gather(*checks))
         else:
             if h.is_string(entity_id):
                 return await self.is_entity_on(entity_id)  # type: ignore
             else:
                 return False
 
+    async def _okno_otevrene_delay(self, entity_id: str) -> bool:
+        return (
+            await self.is_entity_on(entity_id)
+            and await dt.get_changed_diff_sec(self._ba, entity_id) > 2 * 60
+        )
+
     async def get_okno_otevrene_delay(self) -> bool:
         # Otevreno - senzor znamena on
         entity_id = self.get_param_entity(HEAT_PAR.WINDOWS)
         if entity_id is None:
             return False
         if h.is_iterable(entity_id):
-            for e in entity_id:  # type: ignore
-                if (
-                    await self.is_entity_on(e)
-                    and await dt.get_changed_diff_sec(self._ba, e) > 2 * 60
-                ):
-                    return True
-            return False
+            checks = (self._okno_otevrene_delay(e) for e in entity_id)  # type: ignore
+            return any(await asyncio.gather(*checks))
         else:
             if h.is_string(entity_id):
                 return await self.is_entity_on(entity_id)  # type: ignore
@@ -398,13 +462,26 @@ class VentilABC(ChildObjectBasicApp, ApiEntityABC):
         return self.params.get(param)
 
     async def update_attributes(self) -> None:
-        self.temperature = await self._ba.get_state_int(self.sensor_temperature)
-        self.battery_status = await self.get_battery_status()
-        self.target_temperature = await self.get_target_temperature()
-        self.kotel_bezi = await self.is_entity_on(SWITCH_KOTEL)
-        self.aktivni = await self.get_aktivni()
-        self.okno_otevrene_delay = await self.get_okno_otevrene_delay()
-        self.okno_otevrene = await self.get_okno_otevrene()
+        # Independent reads - all at once
+        (
+            self.temperature,
+            self.battery_status,
+            self.target_temperature,
+            self.kotel_bezi,
+            self.aktivni,
+            self.okno_otevrene_delay,
+            self.okno_otevrene,
+            self.heating_manually,
+        ) = await asyncio.gather(
+            self._ba.get_state_int(self.sensor_temperature),
+            self.get_battery_status(),
+            self.get_target_temperature(),
+            self.is_entity_on(SWITCH_KOTEL),
+            self.get_aktivni(),
+            self.get_okno_otevrene_delay(),
+            self.get_okno_otevrene(),
+            self.is_entity_on(TOPENI_RUCNE),
+        )
         self.is_chilly: bool = (
             self.temperature < self.target_temperature and self.temperature > 0
         )
@@ -421,14 +498,10 @@ class VentilABC(ChildObjectBasicApp, ApiEntityABC):
         )
         """
 
-        self.heating_manually = await self.is_entity_on(TOPENI_RUCNE)
-
         def get_minutes(seconds):
             return int(seconds / 60)
 
         attr: dict = {
-            STAT_ATTR.battery_level: self.battery_status,
-            STAT_ATTR.temperature: self.temperature,
             STAT_ATTR.battery_level: self.battery_status,
             STAT_ATTR.temperature: self.temperature,
             STAT_ATTR.active: h.on_off(self.aktivni),
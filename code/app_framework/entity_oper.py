@@ -1,7 +1,8 @@
 # Used for creating helpers
 from dataclasses import dataclass, field
 from enum import auto
-from typing import Union
+import time
+from typing import List, Union
 from apd_types import ApDefBase, EntityObjectABC
 from basic_app import HassBasicApp
 
@@ -64,6 +65,8 @@ ws_oper_def: DictListDef = {
 
 CmdToDoType = Union[CmdToDo, None]
 
+CONCURRENCY = 16  # entity objects in progress in register_batch
+
 
 @dataclass
 class EntityObject(EntityObjectABC):
@@ -163,7 +166,7 @@ class EntityObject(EntityObjectABC):
                 if self.attributes[key] is None:
                     h.remove_key(self.attributes, key)
             h.remove_key(self.attributes, "index_key")
-        self.debug(f"{self.entity_id} prepared in objects {self.attributes}")
+        self.debug("%s prepared in objects %s", self.entity_id, self.attributes)
 
     @property
     def cmd_finished(self) -> bool:
@@ -172,7 +175,7 @@ class EntityObject(EntityObjectABC):
         if self.cmd is None:
             return False
         else:
-            return self.cmd_finished
+            return self.cmd.finished
 
     def set_state(self, value):
         self.state = value
@@ -190,6 +193,7 @@ class EntityOper(HassBasicApp):
     def initialize(self):
         self.debug("EntityOper initialize")
         self.entities_register: dict = {}
+        self._concurrency: int = int(h.par(self.args, "concurrency", CONCURRENCY))
 
     def init(self, end_callback):
         self.ws: WsHA = self.sync_get_app("ws_comm")
@@ -209,7 +213,7 @@ class EntityOper(HassBasicApp):
         while True:
             self.debug("Waiting......")
             id = await self._entity_queue.get()
-            self.debug(f"Id: {id}")
+            self.debug("Id: %s", id)
             eo: EntityObjectType = self._entity_buffer.get(id)
             if eo is None:
                 self.error("Unknown id")
@@ -217,13 +221,18 @@ class EntityOper(HassBasicApp):
             if eo.cmd is None:
                 self.error("Missing cmd defintion")
                 raise ValueError("Missing cmd defintion")
-            self.debug(f"Registering and executing cmd: {eo.cmd.cmd_data}")
-            await self.ws.async_register_cmd(eo.cmd)
-            if eo.cmd_update is not None:
-                while not eo.cmd.finished:
-                    await self.sleep(0.1)
-                self.debug(f"Registering update: {eo.cmd_update.cmd_data}")
-                await self.ws.async_register_cmd(eo.cmd_update)
+            await self._execute(eo)
+
+    async def _execute(self, eo: EntityObject):
+        """Create and its update - update waits only for own create"""
+        assert eo.cmd is not None
+        self.debug("Registering and executing cmd: %s", eo.cmd.cmd_data)
+        await self.ws.async_register_cmd(eo.cmd)
+        await eo.cmd.wait()
+        if eo.cmd_update is not None:
+            self.debug("Registering update: %s", eo.cmd_update.cmd_data)
+            await self.ws.async_register_cmd(eo.cmd_update)
+            await eo.cmd_update.wait()
 
     def _get_cmd_update(self, entity_object: EntityObject) -> Cmd:
         t_str = f"{entity_object.domain}/update"
@@ -271,8 +280,7 @@ class EntityOper(HassBasicApp):
             self.error("Not in keys!")
             return None
 
-    async def register(self, entity_object: EntityObject):
-        self.debug(f"Registering {entity_object}")
+    def _prepare_cmd(self, entity_object: EntityObject):
         if entity_object.cmd_to_do == CmdToDo.UPDATE:
             self.debug("Update")
             entity_object.cmd = self._get_cmd_update(entity_object)
@@ -281,8 +289,45 @@ class EntityOper(HassBasicApp):
             entity_object.cmd = self._get_cmd_create(entity_object)
             entity_object.cmd_update = self._get_cmd_update(entity_object)
 
+    async def register(self, entity_object: EntityObject):
+        self.debug("Registering %s", entity_object)
+        self._prepare_cmd(entity_object)
         self.debug("Putting in queue")
         await self._put_in_queue(entity_object)
 
+    async def register_batch(self, entity_objects: List[EntityObject]) -> float:
+        """Executing all entity objects, up to concurrency in progress
+
+        Args:
+            entity_objects (List[EntityObject]): [description]
+
+        Returns:
+            float: wall time of batch [s]
+        """
+        start = time.perf_counter()
+        slots = asyncio.Semaphore(self._concurrency)
+
+        async def execute(eo: EntityObject):
+            async with slots:
+                try:
+                    await self._execute(eo)
+                except Exception as ex:
+                    template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                    self.error(template.format(type(ex).__name__, ex.args))
+
+        to_execute: List[EntityObject] = []
+        for eo in entity_objects:
+            self._prepare_cmd(eo)
+            if eo.cmd is None:
+                self.error(f"Missing cmd defintion {eo.entity_id}")
+                continue
+            to_execute.append(eo)
+        await asyncio.gather(*[execute(eo) for eo in to_execute])
+        elapsed = time.perf_counter() - start
+        self.info(
+            f"Batch of {len(to_execute)} entities in {elapsed:.2f}s (concurrency {self._concurrency})"
+        )
+        return elapsed
+
 
 EntityOperType = Union[EntityOper, None]
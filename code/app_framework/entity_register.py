@@ -4,6 +4,8 @@
 # creating entities registered in AppSystem - g.helper_register
 #
 import asyncio
+import time
+from typing import Dict
 from apd_types import ApHass
 from bootstart import boot_logger_off, boot_module, boot_logger
 import globals as g
@@ -29,17 +31,26 @@ class EntityRegister(ApHass):
             self._helpers_domain.update({domain_name: False})
 
         self.debug("Updating entity_register - calling list and update")
+        start = time.perf_counter()
+        # all lists are sent together
+        cmds: Dict[str, Cmd] = {
+            domain: self.ws.get_entities(domain) for domain in g.HELPERS
+        }
+        await asyncio.gather(*[cmd.wait() for cmd in cmds.values()])
+
         g.entity_register.clear()
-        # callback in this is calling during flush
+        entities: dict = {}  # ordered set
         cmd: Cmd
-        for domain in g.HELPERS:
-            cmd = self.ws.get_entities(domain)
-            while not cmd.finished:
-                self.info("Waiting")
-                await self.sleep(0.1)
+        for domain, cmd in cmds.items():
+            if cmd.result is None:
+                self.error(f"List of {domain} failed: {cmd.error_code}")
+                continue
             for p in cmd.result:
                 id = p.get("id")
                 if id is not None:
-                    entity_id = domain + "." + id
-                    h.append_entity_register(entity_id)
+                    entities[domain + "." + id] = None
+        g.entity_register.extend(entities)
+        self.info(
+            f"Entity register {len(g.entity_register)} in {time.perf_counter() - start:.2f}s"
+        )
         buffer_control.task_done()
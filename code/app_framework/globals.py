@@ -1,7 +1,7 @@
 from dataclasses import replace
 from typing import Any, Union
-from helper_types import RegisterType, AutoName
-from enum import auto
+from helper_types import IndexedRegister, RegisterType, AutoName
+from enum import IntEnum, auto
 
 ON = "on"
 OFF = "off"
@@ -24,14 +24,15 @@ DAEMON_TERMINATE = "DAEMON_TERMINATE"
 
 module_register: RegisterType = []  # known modules - object of AppBasic
 entity_register: list = [str]  # all entities registered in hass, simple list
-helper_register: RegisterType = []  # entities defined in app_system
-helper_register_obj: list = (
-    []
+helper_register: RegisterType = IndexedRegister()  # entities defined in app_system
+helper_register_obj: RegisterType = (
+    IndexedRegister()
 )  # entities defined in app_system converted in entity_create
-register_button: RegisterType = []
-sensor_register: RegisterType = []
+register_button: RegisterType = IndexedRegister()
+sensor_register: RegisterType = IndexedRegister()
 created_helpers_obj: list = []  # list of created helpers via ws EntityObjects
 time_zone: str = ""  # storing time zone
+state_mirror: Any = None  # StateMirror of WsHA, ws_comm.yaml state_mirror: true
 
 BOOT_CLASSES: tuple = (
     "WsHA",
@@ -57,9 +58,17 @@ class TASK_EVENT(AutoName):
     EXECUTE_TASK = auto()
     IGNORE_STATE = auto()
     TASK_FINISHED = auto()
+    TASK_TIMEOUT = auto()
     BUFFER_STARTED = auto()
 
 
 class BUFFER_EVENT(AutoName):
     WAITING_ON = auto()
     WAITING_OFF = auto()
+
+
+class TASK_PRIORITY(IntEnum):
+    # Lower goes first in BufferInstance queue
+    INTERACTIVE = 0  # TaskBtn
+    NORMAL = 1
+    BACKGROUND = 2  # TaskLoop
@@ -25,6 +25,7 @@ class GlobalsDef(object):
         "BOOT_MODULES_LOADED",
         "BOOT_MODULE_ADDED",
         "APF_MODULES_DONE",
+        "HELPERS_CHANGED",
     ]
 
     DEFINE_CONSTS: list = [
@@ -25,12 +25,15 @@ from helper_types import (
     DictMixed,
     EntityName,
     EnumStrType,
+    INDEX_KEY,
+    IndexedRegister,
     IntType,
     StateType,
     StrType,
     KwargParam,
     ListStr,
     RegisterType,
+    STORED,
     StoredSentence,
 )
 
@@ -40,8 +43,7 @@ from typing import (
     Union,
 )  # avoid recurse
 
-INDEX_KEY = "index_key"
-STORED = "_stored"
+# INDEX_KEY, STORED are defined in helper_types, imported from here as well
 
 
 def sync_wrapper(coro):
@@ -300,6 +302,8 @@ class MyHelp(object):
 
     @staticmethod
     def stored_item(index_key: Union[str, int], store_db: RegisterType) -> Any:
+        if isinstance(store_db, IndexedRegister):
+            return store_db.get_item(index_key)
         if not MyHelp.is_iterable(store_db):
             return None
         s_index_key = MyHelp.index_key_to_str(index_key)
@@ -346,6 +350,8 @@ class MyHelp(object):
         Returns:
             dict|type|None: Stored sentence
         """
+        if isinstance(store_db, IndexedRegister):
+            return store_db.pop_item(index_key)
         if not MyHelp.is_iterable(store_db) or store_db is None:
             return
         s_index_key = MyHelp.index_key_to_str(index_key)
@@ -360,9 +366,8 @@ class MyHelp(object):
     def stored_replace(
         index_key: Union[str, int], store_db: RegisterType, sentence: Any
     ) -> None:
-        reg = MyHelp.stored_get(index_key, store_db)
-        if reg is not None:
-            reg = MyHelp.stored_remove(index_key, store_db)
+        # stored_remove does nothing if not found
+        MyHelp.stored_remove(index_key, store_db)
         MyHelp.stored_push(index_key, store_db, sentence)
 
     @staticmethod
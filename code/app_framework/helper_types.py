@@ -12,6 +12,8 @@ from typing import (
     Coroutine,
     Dict,
     Final,
+    Iterable,
+    Iterator,
     List,
     Tuple,
     Union,
@@ -50,7 +52,67 @@ CALLABLE_T = TypeVar("CALLABLE_T", bound=Callable)
 TupleType = Union[None, tuple]
 BoolType = Union[bool, None]
 StoredItem = Dict[str, Any]
-RegisterType = Union[List[StoredItem], list]
+
+INDEX_KEY = "index_key"
+STORED = "_stored"
+
+
+class IndexedRegister:
+    """Register of stored items (dict with INDEX_KEY) with O(1) access by index key
+
+    Keeps insertion order and behaves as list for iteration, append, remove and
+    clear, so MyHelp.stored_* work with it as with list. Index key is unique -
+    append of existing index key replaces item on the same position.
+    """
+
+    def __init__(self, items: Iterable[StoredItem] = ()):
+        self._items: Dict[str, StoredItem] = {}
+        for item in items:
+            self.append(item)
+
+    @staticmethod
+    def _key(index_key: Any) -> str:
+        return index_key if isinstance(index_key, str) else str(index_key)
+
+    def __iter__(self) -> Iterator[StoredItem]:
+        # copy - register can be changed during walk
+        return iter(list(self._items.values()))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item: Any) -> bool:
+        if isinstance(item, dict):
+            item = item.get(INDEX_KEY)
+        return self._key(item) in self._items
+
+    def __getitem__(self, position: int) -> StoredItem:
+        return list(self._items.values())[position]
+
+    def __repr__(self) -> str:
+        return f"IndexedRegister({list(self._items.values())!r})"
+
+    def append(self, item: StoredItem):
+        self._items[self._key(item[INDEX_KEY])] = item
+
+    def remove(self, item: StoredItem):
+        if self._items.pop(self._key(item[INDEX_KEY]), None) is None:
+            raise ValueError("IndexedRegister.remove(x): x not in register")
+
+    def clear(self):
+        self._items.clear()
+
+    def keys(self) -> List[str]:
+        return list(self._items.keys())
+
+    def get_item(self, index_key: Any) -> Union[StoredItem, None]:
+        return self._items.get(self._key(index_key))
+
+    def pop_item(self, index_key: Any) -> Union[StoredItem, None]:
+        return self._items.pop(self._key(index_key), None)
+
+
+RegisterType = Union[List[StoredItem], list, IndexedRegister]
 ListStr = Union[tuple, List[str]]
 KwargParam = Any
 ParamType = Union[list, dict]
@@ -1,17 +1,25 @@
 """ Definuje takt tzn. veskery _loop je volan odsud 
-definice se vola pres e.DEF_LOOP
+definice se vola pres e.DEF_LOOP nebo register_takt
+e.TAKT is fired only with takt_event: true in app arguments
 """
 
-from typing import NoReturn
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, List, NoReturn, Set, Tuple, Union
 from apd_types import ApHass
 from entity_oper import EntityObject
 from helper_tools import MyHelp as h
 from globals import ON, OFF
 from globals_def import eventsDef as e, constsDef as c
 from bootstart import boot_logger_off, boot_module, boot_logger, ModuleClasses
+from value_journal import ValueJournal
 import globals as g
 
-ENTITY_VALUES = "EntityValues"
+NOT_PERSISTED = ("sensor", "binary_sensor", "input_boolean")  # have own storing
+SUBSCRIBE_LIMIT = 200  # above it one listen_state per domain
+TAKT_INTERVAL = 1  # e.TAKT beat in seconds, opt-in via takt_event: true
 
 
 class LastMile(ApHass):
@@ -23,15 +31,32 @@ class LastMile(ApHass):
         # self.do_log = True
 
         self._stored_filename = h.storage_path() + "appf.yaml"
-        self.takt_defs: dict = {}
+        self._stored_values = ValueJournal(self._stored_filename)
+        self.takt_defs: Dict[str, TaktDef] = {}
+        # (next_beat, seq, takt_def) - wakes up only when beat is due
+        # entry of replaced takt_def (registered again) is skipped
+        self._takt_heap: List[Tuple[float, int, "TaktDef"]] = []
+        self._takt_seq = itertools.count()
+        self._takt_wakeup: Union[asyncio.Event, None] = None
+        self._takt_started: float = time.monotonic()
+        self.takt_wakeups = 0
+        self.takt_callbacks = 0
+        self.takt_events = 0
+        self.takt_skipped = 0  # callback of previous beat still running
         self.debug("Starting initializing takt")
         # Listening for definition of loop
         self.sync_listen_event(self._takt_op, e.DEF_LOOP)
-        self.sync_listen_state(self._listen_state)
-        # Pouze pocatecni start
-        self._log_counter = 5
+        # Persisted helpers only, see refresh_subscriptions
+        self._persisted: Set[str] = set()
+        self._handles: Dict[str, Any] = {}  # entity_id or domain: handle
+        self.sync_listen_event(self._helpers_changed, e.HELPERS_CHANGED)
         self._takt_handler = None
 
+    def terminate(self):
+        self.debug(f"Stored values {self._stored_values.stats}")
+        self.debug(f"Takt {self.takt_stats}")
+        self._stored_values.close()
+
     def init(self, callback):
         self.callback = callback
         self.restore_data()
@@ -43,23 +68,112 @@ class LastMile(ApHass):
                 self.debug(f"Not exists: {entity_object.entity_id}")
             elif not entity_object.data_restored:
                 entity_object.set_state(entity_object.initial)
+        self.refresh_subscriptions()
         self.sync_create_task(self._main_loop_takt())
 
     async def _main_loop_takt(self):
         """Vlastni loop"""
         self.info("Takt starting")
+        self._takt_wakeup = asyncio.Event()
+        self._takt_started = time.monotonic()
+        if self.args.get("takt_event", False):
+            # compatibility - e.TAKT on bus every second
+            await self.register_takt(e.TAKT, TAKT_INTERVAL, fire_event=True)
         self.callback(self)
         takt_def: TaktDef
         while True:
-            self._log_counter -= 1
-            if self._log_counter <= 0:
-                self._log_counter = 5
-            await self.fire_event(e.TAKT)
-            for k in self.takt_defs.keys():
-                takt_def = self.takt_defs[k]
-                if takt_def.beat:
+            now = time.monotonic()
+            while self._takt_heap and self._takt_heap[0][0] <= now:
+                _, _, takt_def = heapq.heappop(self._takt_heap)
+                if self.takt_defs.get(takt_def.trigger) is not takt_def:
+                    continue
+                if takt_def.stop:
+                    self.takt_defs.pop(takt_def.trigger, None)
+                    continue
+                takt_def.beat(now)
+                self._dispatch_beat(takt_def)
+                heapq.heappush(
+                    self._takt_heap,
+                    (takt_def.next_beat, next(self._takt_seq), takt_def),
+                )
+            delay = self._takt_heap[0][0] - now if self._takt_heap else None
+            self._takt_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._takt_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.takt_wakeups += 1
+
+    def _dispatch_beat(self, takt_def: "TaktDef"):
+        """Beat runs as task - slow callback does not delay other takts
+
+        Beat of takt with callback still running from previous beat is skipped
+        """
+        if takt_def.running is not None and not takt_def.running.done():
+            self.takt_skipped += 1
+            return
+        takt_def.running = asyncio.get_running_loop().create_task(
+            self._beat(takt_def)
+        )
+
+    async def _beat(self, takt_def: "TaktDef"):
+        try:
+            if takt_def.callback is not None:
+                self.takt_callbacks += 1
+                if h.is_async(takt_def.callback):
+                    await takt_def.callback(takt_def.get_value)
+                else:
+                    await self.run_in_executor(takt_def.callback, takt_def.get_value)
+            if takt_def.fire_event:
+                self.takt_events += 1
+                if takt_def.trigger == e.TAKT:
+                    await self.fire_event(e.TAKT)
+                else:
                     await self.fire_event(takt_def.trigger, value=takt_def.get_value)
-            await self.sleep(1)
+        except Exception as ex:
+            template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+            message = template.format(type(ex).__name__, ex.args)
+            self.error(message)
+
+    async def register_takt(
+        self,
+        trigger: str,
+        interval: float,
+        callback: Union[Callable, None] = None,
+        fire_event: bool = False,
+    ):
+        """Beat every interval seconds, callback is called in-process
+
+        Args:
+            trigger (str): name of takt, event name if fire_event
+            interval (float): in seconds
+            callback (Callable, optional): callback(value), sync or async. Defaults to None.
+            fire_event (bool, optional): firing trigger event on bus. Defaults to False.
+        """
+        takt_def = TaktDef(trigger, interval, callback, fire_event)
+        takt_def.next_beat = time.monotonic() + interval
+        self.takt_defs[trigger] = takt_def
+        heapq.heappush(
+            self._takt_heap, (takt_def.next_beat, next(self._takt_seq), takt_def)
+        )
+        if self._takt_wakeup is not None:
+            self._takt_wakeup.set()
+
+    async def stop_takt(self, trigger: str):
+        takt_def = self.takt_defs.get(trigger)
+        if takt_def is not None:
+            takt_def.stop = True
+
+    @property
+    def takt_stats(self) -> dict:
+        minutes = max(time.monotonic() - self._takt_started, 1) / 60
+        return dict(
+            takts=len(self.takt_defs),
+            wakeups_per_minute=round(self.takt_wakeups / minutes, 1),
+            callbacks_per_minute=round(self.takt_callbacks / minutes, 1),
+            events_per_minute=round(self.takt_events / minutes, 1),
+            skipped=self.takt_skipped,
+        )
 
     def _takt_op(self, *kwargs):
         """Definuje taktování
@@ -73,12 +187,41 @@ class LastMile(ApHass):
             kwargs, [c.trigger, c.interval, c.todo]
         )
 
+        # defined via bus - beat is fired as event trigger
         if interval:
-            self.takt_defs[trigger] = TaktDef(trigger, interval)
+            self.sync_create_task(
+                self.register_takt(trigger, interval, fire_event=True)
+            )
         if to_do:
             if to_do == "stop":
-                takt_def = self.takt_defs[trigger]
-                takt_def.stop = True
+                self.sync_create_task(self.stop_takt(trigger))
+
+    def _helpers_changed(self, event_name, data, kwargs):
+        self.refresh_subscriptions()
+
+    def refresh_subscriptions(self):
+        """Listening to persisted helpers of g.helper_register_obj
+
+        Per entity up to SUBSCRIBE_LIMIT, otherwise per domain and _listen_state
+        is filtered by self._persisted
+        """
+        entity_object: EntityObject
+        persisted: Set[str] = set()
+        for entity_object in h.stored_get_stored(g.helper_register_obj):
+            if entity_object.domain not in NOT_PERSISTED:
+                persisted.add(entity_object.entity_id)
+        if len(persisted) > SUBSCRIBE_LIMIT:
+            wanted = {entity_id.split(".")[0] for entity_id in persisted}
+        else:
+            wanted = persisted
+        self._persisted = persisted
+        for key in list(self._handles.keys()):
+            if key not in wanted:
+                self.sync_cancel_listen_state(self._handles.pop(key))
+        for key in wanted:
+            if key not in self._handles:
+                self._handles[key] = self.sync_listen_state(self._listen_state, key)
+        self.debug(f"Listening {len(self._handles)} for {len(persisted)} helpers")
 
     def _listen_state(self, entity, attribute, old, new, kwargs):
         """Listener for storing values
@@ -90,7 +233,7 @@ class LastMile(ApHass):
             new ([type]): [description]
             kwargs ([type]): [description]
         """
-        if old == new:
+        if old == new or entity not in self._persisted:
             return
 
         entity_object: EntityObject = h.stored_get(entity, g.helper_register_obj)
@@ -99,81 +242,62 @@ class LastMile(ApHass):
             return
         # This entities has own stored
         if (
-            entity_object.domain in ("sensor", "binary_sensor", "input_boolean")
+            entity_object.domain in NOT_PERSISTED
             or entity_object.state == new
         ):
             return
         self.debug(f"Zapis: {entity}")
-        stored_values: dict = h.get_yaml(self._stored_filename)
-        if not ENTITY_VALUES in stored_values.keys():
-            stored_values[ENTITY_VALUES] = []
-        entities_list = stored_values[ENTITY_VALUES]
-        found = False
-        for ent_dict in entities_list:
-            key_list = ent_dict.keys()
-            key_iterator = iter(key_list)
-            key = next(key_iterator)
-            if key == entity:
-                found = True
-                ent_dict.update({entity: new})
-                break
-        if not found:
-            stored_values[ENTITY_VALUES].append({entity: new})
         entity_object.state = new
-        self.debug(stored_values)
-        h.save_yaml(self._stored_filename, stored_values, sort_keys=True)
+        try:
+            self._stored_values.set(entity, new)
+        except Exception as ex:
+            template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+            message = template.format(type(ex).__name__, ex.args)
+            self.error(message)
 
     def restore_data(self):
-        try:  # The reason is Tuyaha
-            stored_values: dict = h.get_yaml(self._stored_filename)
-        except:
-            raise ValueError("Fatal error in declaration of stored filename")
-
-        # stored
-        if ENTITY_VALUES in stored_values.keys():
-            self.debug(stored_values)
-            records = stored_values[ENTITY_VALUES]
-
-            entity_object: EntityObject
-            for record in records:
-                entity_id = h.get_first_key_in_dict(record)
-                if entity_id is None:
-                    continue
+        # The reason is Tuyaha - ValueError if file cannot be read
+        stored_values = self._stored_values.load()
+        self.debug(stored_values)
 
-                entity_object = h.stored_get(entity_id, g.helper_register_obj)
+        entity_object: EntityObject
+        for entity_id, value in stored_values.items():
+            entity_object = h.stored_get(entity_id, g.helper_register_obj)
 
-                if entity_object is None:
-                    continue
-                value = record[entity_id]
-                self.debug(f"record: {record}: entity_id: {entity_id} value: {value}")
-                entity_object.set_state(value)
-                entity_object.data_restored = True
-                h.stored_replace(entity_id, g.helper_register_obj, entity_object)
+            if entity_object is None:
+                continue
+            self.debug(f"entity_id: {entity_id} value: {value}")
+            entity_object.set_state(value)
+            entity_object.data_restored = True
+            h.stored_replace(entity_id, g.helper_register_obj, entity_object)
 
 
 class TaktDef(object):
-    def __init__(self, trigger, interval):
+    def __init__(self, trigger, interval, callback=None, fire_event=False):
         # Event waht will be fired
         self.trigger = trigger
         self.interval = interval
-        self.counter = 0
+        self.callback = callback
+        self.fire_event = fire_event
+        self.next_beat: float = 0
         self.value = interval
         self.repeat = True
         self.stop = False
+        self.running: Any = None  # asyncio.Task of last beat
 
-    @property
-    def beat(self):
-        if self.stop:
-            return False
-        ret_val = False
-        self.is_beat()
+    def beat(self, now: float):
+        """Called by LastMile when next_beat is due
 
-        self.counter += 1
-        if self.counter >= self.interval:
-            self.counter = 0
-            ret_val = True
-        self.value -= 1
-        return ret_val
+        Args:
+            now (float): time.monotonic()
+        """
+        self.is_beat()
+        # value was decremented every second
+        self.value -= self.interval
+        self.next_beat += self.interval
+        if self.next_beat <= now:
+            # system was busy, not catching up missed beats
+            self.next_beat = now + self.interval
 
     @property
     def get_value(self):
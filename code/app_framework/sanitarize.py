@@ -1,5 +1,6 @@
 """ Trying to control flow  """
 import asyncio
+import time
 from apd_types import ApHass
 from create_helpers import CreateHelpers
 from entity_oper import EntityObject
@@ -73,6 +74,7 @@ class Sanitarize(ApHass):
 
         for p in tasks.keys():
             await control_buffer.put(p)
+        self._start = time.perf_counter()
         try:
             while True:
                 process = await control_buffer.get()
@@ -81,7 +83,9 @@ class Sanitarize(ApHass):
                 if to_do is None:
                     self.error("Wrong definition in tasks")
                     raise ValueError("Wrong definition in tasks")
+                start = time.perf_counter()
                 await to_do
+                self.info(f"{process} done in {time.perf_counter() - start:.2f}s")
         except Exception as ex:
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
             message = template.format(type(ex).__name__, ex.args)
@@ -89,6 +93,7 @@ class Sanitarize(ApHass):
             raise ValueError("Fatal error in core")
 
     async def _task_done(self, control_buffer: asyncio.Queue):
+        self.info(f"Sanitarize done in {time.perf_counter() - self._start:.2f}s")
         # info bootstart that it is done
         self._handler_loop.cancel()  # type: ignore
         self.end_callback(self)
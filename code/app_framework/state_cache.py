@@ -0,0 +1,142 @@
+# Read-through cache of entity states for BasicApp typed getters
+#
+# Off by default, app turns it on by args state_cache_ttl.
+# Entry is removed by state_changed listener of the entity (listen_state
+# with attribute "all"), by own writes of the app and TTL is fallback for
+# missed events. Listener is registered before first reading, value read
+# during invalidation is not stored (version of entity).
+# Parsed values (e.g. float of state) are kept in entry - parsed once per change.
+#
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Tuple, Union
+
+STATE_CACHE_TTL = 0  # [s] expiration of entry, 0 - cache is off
+STATE = "state"  # key of state in entry values
+_CACHED_TYPES = (str, int, float, bool)  # mutable values are not cached
+
+
+@dataclass
+class CachedEntity:
+    values: Dict[str, Any] = field(default_factory=dict)  # attribute: value
+    # (kind, attribute): (source value, parsed value)
+    parsed: Dict[Tuple[str, str], Tuple[Any, Any]] = field(default_factory=dict)
+    stamp: float = field(default_factory=time.monotonic)
+
+
+class StateCache:
+    def __init__(self, ttl: float = STATE_CACHE_TTL):
+        self.ttl = ttl
+        self._entities: Dict[str, CachedEntity] = {}
+        self._watched: set = set()  # entities with state_changed listener
+        self._versions: Dict[str, int] = {}  # entity: count of invalidations
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _entity(self, entity_id: str) -> Union[CachedEntity, None]:
+        cached = self._entities.get(entity_id)
+        if cached is None:
+            return None
+        if time.monotonic() - cached.stamp > self.ttl:
+            self._entities.pop(entity_id, None)
+            return None
+        return cached
+
+    def get(self, entity_id: str, attribute: Any = None) -> Tuple[bool, Any]:
+        """Value as get_state(entity_id, attribute)
+
+        Returns:
+            Tuple[bool, Any]: found, value
+        """
+        cached = self._entity(entity_id)
+        key = STATE if attribute is None else attribute
+        if cached is None or key not in cached.values:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, cached.values[key]
+
+    def watch(self, entity_id: str) -> bool:
+        """Before reading from AppDaemon
+
+        Returns:
+            bool: True if entity is not watched yet - listener is needed
+        """
+        if not self.enabled or entity_id in self._watched:
+            return False
+        self._watched.add(entity_id)
+        return True
+
+    def version(self, entity_id: str) -> int:
+        return self._versions.get(entity_id, 0)
+
+    def put(self, entity_id: str, attribute: Any, value: Any, version: int):
+        """Storing value read from AppDaemon
+
+        Args:
+            version (int): version(entity_id) before reading, value is not
+                stored if entity was invalidated meanwhile
+        """
+        if (
+            not self.enabled
+            or entity_id not in self._watched
+            or version != self.version(entity_id)
+            or not isinstance(value, _CACHED_TYPES)
+        ):
+            return
+        cached = self._entity(entity_id)
+        if cached is None:
+            cached = self._entities[entity_id] = CachedEntity()
+        cached.values[STATE if attribute is None else attribute] = value
+
+    def exists(self, entity_id: str) -> bool:
+        return self._entity(entity_id) is not None
+
+    def get_parsed(
+        self, entity_id: str, kind: str, source: Any, attribute: Any = None
+    ) -> Tuple[bool, Any]:
+        """Value of kind (e.g. "float") parsed from source - state or attribute"""
+        cached = self._entity(entity_id)
+        key = STATE if attribute is None else attribute
+        if cached is None or (kind, key) not in cached.parsed:
+            return False, None
+        parsed_source, value = cached.parsed[(kind, key)]
+        if parsed_source != source:
+            return False, None
+        return True, value
+
+    def put_parsed(
+        self, entity_id: str, kind: str, source: Any, value: Any, attribute: Any = None
+    ):
+        """Only to existing entry - removed with entry after change"""
+        cached = self._entities.get(entity_id)
+        if cached is not None:
+            key = STATE if attribute is None else attribute
+            cached.parsed[(kind, key)] = (source, value)
+
+    def invalidate(self, entity_id: str):
+        if entity_id in self._watched:
+            self._versions[entity_id] = self.version(entity_id) + 1
+        if self._entities.pop(entity_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entities.clear()
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            entities=len(self._entities),
+            watched=len(self._watched),
+            hits=self.hits,
+            misses=self.misses,
+            invalidations=self.invalidations,
+        )
+
+
+StateCacheType = Union[StateCache, None]
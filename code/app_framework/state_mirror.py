@@ -0,0 +1,219 @@
+# In-memory copy of HA states maintained by WsHA (ws_comm)
+#
+# Seeded by one get_states, then patched by state_changed events
+# Events arriving during seeding are buffered and replayed over the snapshot
+# https://developers.home-assistant.io/docs/api/websocket#subscribe-to-events
+#
+# Opt-in in ws_comm.yaml - state_mirror: true, accessible as g.state_mirror
+#
+import copy
+from dataclasses import dataclass, field
+import time
+from typing import Any, Dict, Tuple, Union
+
+from helper_types import BoolType, DictType, StrType
+
+STATE_CHANGED = "state_changed"
+ALL = "all"
+
+
+@dataclass
+class EntityState:
+    entity_id: str
+    state: Any = None
+    attributes: dict = field(default_factory=dict)
+    last_changed: StrType = None
+    last_updated: StrType = None
+    received: float = 0  # time.monotonic() of last patch
+
+    @property
+    def age(self) -> float:
+        """Seconds since the state was patched in mirror"""
+        return time.monotonic() - self.received
+
+    @property
+    def all(self) -> dict:
+        """Same shape as get_state(attribute="all")"""
+        return dict(
+            entity_id=self.entity_id,
+            state=self.state,
+            attributes=copy.deepcopy(self.attributes),
+            last_changed=self.last_changed,
+            last_updated=self.last_updated,
+        )
+
+    def get(self, attribute: StrType = None) -> Any:
+        """Value same as AppDaemon get_state(entity_id, attribute)
+
+        Args:
+            attribute (StrType, optional): None - state, "all" - whole state
+
+        Returns:
+            Any: [description]
+        """
+        if attribute is None:
+            return self.state
+        if attribute == ALL:
+            return self.all
+        if attribute in self.attributes:
+            return self.attributes[attribute]
+        if attribute == "state":
+            return self.state
+        if attribute in ("last_changed", "last_updated"):
+            return getattr(self, attribute)
+        return None
+
+
+EntityStateType = Union[EntityState, None]
+
+
+def _entity_state(data: dict, received: float) -> EntityState:
+    return EntityState(
+        entity_id=data.get("entity_id", ""),
+        state=data.get("state"),
+        attributes=data.get("attributes") or {},
+        last_changed=data.get("last_changed"),
+        last_updated=data.get("last_updated"),
+        received=received,
+    )
+
+
+class StateMirror:
+    """entity_id -> EntityState, valid only while subscription is alive"""
+
+    def __init__(self):
+        self._states: Dict[str, EntityState] = {}
+        self.valid: bool = False
+        self.seeded_at: float = 0  # time.monotonic() of last get_states
+        self._pending: Union[list, None] = None  # events during seeding
+        self.seeds: int = 0
+        self.events: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def begin_seed(self):
+        """Before subscription - events are buffered until seed"""
+        self._pending = []
+
+    def seed(self, states: list):
+        """Replacing whole content by result of get_states, buffered events
+        are applied after in order of arrival
+
+        Args:
+            states (list): [description]
+        """
+        now = time.monotonic()
+        self._states = {
+            item["entity_id"]: _entity_state(item, now)
+            for item in states
+            if "entity_id" in item
+        }
+        pending = self._pending or []
+        self._pending = None
+        for event in pending:
+            if not self._older_than_snapshot(event):
+                self._apply(event)
+        self.seeded_at = now
+        self.seeds += 1
+        self.valid = True
+
+    def _older_than_snapshot(self, event: dict) -> bool:
+        """Event already contained in snapshot (ISO timestamps of HA)"""
+        new_state = event.get("data", {}).get("new_state") or {}
+        entity = self._states.get(new_state.get("entity_id", ""))
+        updated = new_state.get("last_updated")
+        if entity is None or entity.last_updated is None or updated is None:
+            return False
+        return updated < entity.last_updated
+
+    def invalidate(self):
+        """Connection lost - events can be missed, getters go to AppDaemon"""
+        self.valid = False
+        self._pending = None
+
+    def apply_event(self, event: DictType):
+        """Callback of state_changed subscription
+
+        Args:
+            event (DictType): event part of HA message
+        """
+        if event is None:
+            return
+        if self._pending is not None:
+            self._pending.append(event)
+            return
+        self._apply(event)
+
+    def _apply(self, event: dict):
+        data: dict = event.get("data", {})
+        entity_id = data.get("entity_id")
+        if entity_id is None:
+            return
+        self.events += 1
+        new_state = data.get("new_state")
+        if new_state is None:
+            # entity removed
+            self._states.pop(entity_id, None)
+            return
+        self._states[entity_id] = _entity_state(new_state, time.monotonic())
+
+    def lookup(self, entity_id: str, attribute: StrType = None) -> Tuple[bool, Any]:
+        """Returns (found, value), value as AppDaemon get_state
+
+        Args:
+            entity_id (str): [description]
+            attribute (StrType, optional): [description]. Defaults to None.
+
+        Returns:
+            Tuple[bool, Any]: found False - ask AppDaemon
+        """
+        if not self.valid:
+            self.misses += 1
+            return False, None
+        entity = self._states.get(entity_id)
+        if entity is None:
+            # also possible unknown entity - AppDaemon decides
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, entity.get(attribute)
+
+    def exists(self, entity_id: str) -> BoolType:
+        """True/False if mirror is valid, None - unknown
+
+        Args:
+            entity_id (str): [description]
+
+        Returns:
+            BoolType: [description]
+        """
+        if not self.valid:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entity_id in self._states
+
+    def age(self, entity_id: str) -> Union[float, None]:
+        """Seconds since last patch of entity, None if not in mirror"""
+        entity = self._states.get(entity_id)
+        if entity is None:
+            return None
+        return entity.age
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            entities=len(self._states),
+            valid=self.valid,
+            seeds=self.seeds,
+            events=self.events,
+            hits=self.hits,
+            misses=self.misses,
+            seed_age=time.monotonic() - self.seeded_at if self.seeds > 0 else None,
+        )
+
+
+StateMirrorType = Union[StateMirror, None]
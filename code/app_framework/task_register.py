@@ -1,21 +1,25 @@
-from enum import Enum
+import asyncio
+from enum import Enum, auto
+from inspect import iscoroutine
 from types import FunctionType, MethodType
 from typing import Any, Tuple, Union
 from apd_types import (
     BufferInstanceType,
     BufferInterfaceABC,
     ExecuteFunctionType,
+    ExecutorGuard,
     StateFunctionABCType,
     TaskBaseABC,
     TaskBtnABC,
     TaskCoroABC,
     TaskLoopABC,
     TaskParamABC,
+    executor_guard,
 )
 from decorators import overrides
 
 
-from globals import TASK_EVENT
+from globals import TASK_EVENT, TASK_PRIORITY
 from globals_def import GEVNT
 from helper_types import (
     BoolType,
@@ -30,10 +34,97 @@ from helper_types import (
     TupleType,
 )
 import uuid
+import weakref
 from helper_tools import DateTimeOp as dt, MyHelp as h
 from sensor_entities import BinarySensorType
 
 RegNameType = Union[str, Enum, None]
+TASK_TIMEOUT = 60  # [s] default limit of TaskCoro execution, 0 - without limit
+
+
+class CallKind(Enum):
+    AWAIT = auto()  # coroutine function - called and awaited
+    COROUTINE = auto()  # coroutine object - awaited
+    DIRECT = auto()  # function - called in loop
+    EXECUTOR = auto()  # sync method - run_in_executor
+
+
+# function (__func__ of method): kind, entry is dropped with function
+_call_kinds: "weakref.WeakKeyDictionary[Any, CallKind]" = weakref.WeakKeyDictionary()
+
+
+def call_kind(fce: Any) -> CallKind:
+    """How to call fce, inspect is used once per function
+
+    Args:
+        fce (Any): [description]
+
+    Returns:
+        CallKind: [description]
+    """
+    if iscoroutine(fce):
+        return CallKind.COROUTINE
+    key = getattr(fce, "__func__", fce)
+    try:
+        kind = _call_kinds.get(key)
+    except TypeError:
+        # not weakly referenceable (builtin) - not cached
+        key, kind = None, None
+    if kind is None:
+        if h.is_async(fce):
+            kind = CallKind.AWAIT
+        elif isinstance(fce, FunctionType):
+            kind = CallKind.DIRECT
+        else:
+            kind = CallKind.EXECUTOR
+        if key is not None:
+            _call_kinds[key] = kind
+    return kind
+
+
+@dataclass
+class CallAdapter:
+    """(fce, param) of call_fce resolved in advance"""
+
+    fce: Any
+    param: Any = None
+    kind: CallKind = CallKind.EXECUTOR
+
+    @staticmethod
+    def create(called: Any) -> "CallAdapterType":
+        """From tuple (fce, param)
+
+        Args:
+            called (Any): tuple, CallAdapter or None
+
+        Returns:
+            CallAdapterType: None if there is nothing to call
+        """
+        if called is None or isinstance(called, CallAdapter):
+            return called
+        fce, param = called
+        if fce is None:
+            return None
+        return CallAdapter(fce, param, call_kind(fce))
+
+    async def call(self, parent: BufferInterfaceABC) -> Any:
+        kind = self.kind
+        if kind is CallKind.AWAIT:
+            if self.param is None:
+                return await self.fce()
+            return await self.fce(self.param)
+        if kind is CallKind.DIRECT:
+            if self.param is None:
+                return self.fce()
+            return self.fce(self.param)
+        if kind is CallKind.EXECUTOR:
+            if self.param is None:
+                return await parent.run_in_executor(self.fce)
+            return await parent.run_in_executor(self.fce, self.param)
+        return await self.fce
+
+
+CallAdapterType = Union[CallAdapter, None]
 
 
 @dataclass
@@ -44,7 +135,7 @@ class TaskBase(TaskBaseABC):
     delay_minimum_in_queue: int = (
         0  # minimum delay before this task is running if it is in queue
     )
-    _listen_state_handler: Any = None
+    priority: int = TASK_PRIORITY.NORMAL  # order in BufferInstance queue
     listen_to_state_event: bool = False  #  listening for GEVNT.BUFFER_INSTANCE_STATE_CHANGED - usually used in question function of state
 
     def __post_init__(self):
@@ -57,24 +148,11 @@ class TaskBase(TaskBaseABC):
 
     def set_parent(self, parent: BufferInterfaceABC):
         self.parent = parent
-        self.debug(f"Setting parent: {self.name} handler {self._listen_state_handler}")
-        if self._listen_state_handler is None:
-            self._listen_state_handler = self.parent.sync_listen_event(
-                self._state_event, GEVNT.BUFFER_INSTANCE_STATE_CHANGED.value
-            )
+        self.debug("Setting parent: %s", self.name)
         if self.buffer_instance_name is None:
             assert self.parent is not None
             self.buffer_instance_name = self.parent.get_instance_name()
 
-    async def _state_event(self, event, data, kwargs):
-        """
-        self.debug(
-            f"Listenting state: event: {event} enabled: {self.listen_to_state_event} name: {self.name}"
-        )
-        """
-        if self.listen_to_state_event:
-            await self.state_changed()
-
     async def state_changed(self):
         pass
 
@@ -88,27 +166,29 @@ class TaskBase(TaskBaseABC):
             )
             return self._buffer_instance
 
-    def debug(self, msg):
+    def debug(self, msg, *args):
         assert (
             self.parent is not None
         ), f"Cannot debug: self.parent is None task: {self.name}"
-        self.parent.debug(f"({self.module_name}) {msg}")
+        if not self.parent.debug_on:
+            return
+        self.parent.debug(f"({self.module_name}) {msg}", *args)
 
-    def info(self, msg):
+    def info(self, msg, *args):
         assert (
             self.parent is not None
         ), f"Cannot info: self.parent is None task: {self.name}"
-        self.parent.info(f"({self.module_name}) {msg}")
+        self.parent.info(f"({self.module_name}) {msg}", *args)
 
-    def warning(self, msg):
+    def warning(self, msg, *args):
         assert (
             self.parent is not None
         ), f"Cannot warning: self.parent is None task: {self.name}"
-        self.parent.warning(f"({self.module_name}) {msg}")
+        self.parent.warning(f"({self.module_name}) {msg}", *args)
 
-    def error(self, msg):
+    def error(self, msg, *args):
         if self.parent is not None:
-            self.parent.error(f"({self.module_name}) {msg}")
+            self.parent.error(f"({self.module_name}) {msg}", *args)
 
     async def execute(self, **kwargs):
         self.error("Missing execute")
@@ -122,16 +202,16 @@ class TaskBase(TaskBaseABC):
                 self.debug("Returning without param")
                 return investigate()
             else:
-                self.debug(f"Returning with param {param_call}")
+                self.debug("Returning with param %s", param_call)
                 return investigate(param_call)
         else:
             return investigate
 
-    async def call_fce(self, called: tuple):
+    async def call_fce(self, called: Union[tuple, CallAdapter]):
         """Can call sync and async
 
         Args:
-            called (tuple): [description]
+            called (tuple, CallAdapter): (fce, param) or resolved CallAdapter
 
         Raises:
             ValueError: [description]
@@ -141,32 +221,11 @@ class TaskBase(TaskBaseABC):
         """
         try:
             assert self.parent is not None, "Parent is None"
-            investigate, param_call = called
-            if investigate is None:
+            adapter = CallAdapter.create(called)
+            if adapter is None:
                 self.error("Asking to call None in call_fce")
                 return
-            self.debug(f"For investigate: {investigate}, {param_call}")
-            if h.is_async(investigate):
-                to_call: CoroutinePointer = self.get_courotine(
-                    investigate=investigate, param_call=param_call
-                )
-                if to_call is None:
-                    return None
-                else:
-                    await to_call
-            else:
-                if isinstance(investigate, FunctionType):
-                    if param_call is None:
-                        return investigate()
-                    else:
-                        return investigate(param_call)
-                else:
-                    if param_call is None:
-                        return await self.parent.run_in_executor(investigate)
-                    else:
-                        return await self.parent.run_in_executor(
-                            investigate, param_call
-                        )
+            return await adapter.call(self.parent)
         except Exception as ex:
             template = (
                 "An exception of type {0} occurred in task_register. Arguments:\n{1!r}"
@@ -190,7 +249,8 @@ class TaskBase(TaskBaseABC):
             s_event = event.value
         if name is None:
             name = self.name
-        await self.parent.fire_event(s_event, task_param=arg)
+        # in-process bus, mirrored to AppDaemon according mirror_events
+        await self.parent.buffer_control.bus.fire(s_event, task_param=arg)
 
 
 InstanceNameType = Union[str, TaskBase, Enum, None]
@@ -200,16 +260,19 @@ InstanceNameType = Union[str, TaskBase, Enum, None]
 class TaskCoro(TaskBase, TaskCoroABC):
     on_start: CallableType = None
     on_end: CallableType = None
-    timeout: int = 15  # Timeout for executing
+    timeout: float = TASK_TIMEOUT  # Timeout for executing, 0 - without limit
     time_overflow: bool = False
+    timeouts: int = field(default=0)  # count of expired timeouts
     _coro_must_be_async: bool = False
     state_is_on: StateQuestionType = None
     state_is_off: StateQuestionType = None
-    state_on: TupleType = field(default=None)
-    state_off: TupleType = field(default=None)
+    state_on: CallAdapterType = field(default=None)
+    state_off: CallAdapterType = field(default=None)
 
     _timestamp_start: float = field(default=0)
     _timestamp_end: float = field(default=0)
+    # threads of run_in_executor, they survive expired timeout
+    _executor: ExecutorGuard = field(default_factory=ExecutorGuard, repr=False)
 
     def __post_init__(self):
         super().__post_init__()
@@ -228,9 +291,9 @@ class TaskCoro(TaskBase, TaskCoroABC):
         self.state_on = self._assign_question(self.state_is_on)
         self.state_off = self._assign_question(self.state_is_off)
 
-    def _question(self, question: StateQuestionType) -> TupleType:
+    def _question(self, question: StateQuestionType) -> CallAdapterType:
         if self.state_function is not None:
-            return (self.state_function.is_state, question)
+            return CallAdapter.create((self.state_function.is_state, question))
         else:
             return None
 
@@ -273,6 +336,60 @@ class TaskCoro(TaskBase, TaskCoroABC):
         self.debug("do_execute in TaskCoro")
         await self.call_fce(exe)
 
+    async def _execute_in_time(self, exe: tuple, **kwargs) -> bool:
+        """do_execute limited by self.timeout, after expiration it is cancelled
+
+        Args:
+            exe (tuple): [description]
+
+        Returns:
+            bool: False if timeout expired
+        """
+        self.time_overflow = False
+        # run_in_executor of ApHass reports threads of this execution
+        token = executor_guard.set(self._executor)
+        try:
+            if self.timeout <= 0:
+                await self.do_execute(exe, **kwargs)
+                return True
+            # context with guard is copied to the future
+            execution = asyncio.ensure_future(self.do_execute(exe, **kwargs))
+        finally:
+            executor_guard.reset(token)
+        try:
+            done, _ = await asyncio.wait({execution}, timeout=self.timeout)
+        except asyncio.CancelledError:
+            execution.cancel()
+            await asyncio.wait({execution})
+            raise
+        if not done:
+            # waiting for run_in_executor is cancelled, thread itself is not -
+            # set timeout only for coroutines safe to be abandoned
+            execution.cancel()
+            # cleanup of cancelled coroutine must not overlap next task
+            await asyncio.wait({execution})
+            return False
+        # exception from do_execute
+        execution.result()
+        return True
+
+    async def _timeout_expired(self):
+        self.time_overflow = True
+        self.timeouts += 1
+        self.warning(
+            "Timeout %ss expired, cancelled: %s (%s times)",
+            self.timeout,
+            self.name,
+            self.timeouts,
+        )
+        await self.fire_event(
+            TASK_EVENT.TASK_TIMEOUT,
+            arg={"name": self.name, "timeout": self.timeout},
+        )
+        if not self.auto_done:
+            # cancelled coroutine will not call task_done
+            await self.parent.task_done(self)
+
     async def execute(self, **kwargs):
         self.debug("Base task register")
         arg = kwargs.get("arg")
@@ -280,12 +397,21 @@ class TaskCoro(TaskBase, TaskCoroABC):
             # How to long delay before start
             # useful for asking api server
             await self.parent.sleep(self.delay_minimum_in_queue)
-        self.debug(f"To call: coro {self.coro} with arg: {arg}")
+        self.debug("To call: coro %s with arg: %s", self.coro, arg)
         try:
             if arg is None:
                 arg = self.arg
 
             assert self.parent is not None
+            if self._executor.busy:
+                # thread of expired execution would run together with new one
+                self.warning(
+                    "Skipped %s, executor of expired execution is still running",
+                    self.name,
+                )
+                if not self.auto_done:
+                    await self.parent.task_done(self)
+                return
             self.running = True
             time = await self.parent.now()
             if time is not None:
@@ -293,8 +419,10 @@ class TaskCoro(TaskBase, TaskCoroABC):
             if self.on_start is not None and callable(self.on_start):
                 self.debug("On start")
                 await self.parent.run_in_executor(self.on_start)
-            self.debug(f"Execute coro: {self.coro} with arg: {arg}")
-            await self.do_execute((self.coro, arg), **kwargs)
+            self.debug("Execute coro: %s with arg: %s", self.coro, arg)
+            if not await self._execute_in_time((self.coro, arg), **kwargs):
+                await self._timeout_expired()
+            # on_end is not called after time overflow
             await self.task_finished()
         except Exception as ex:
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
@@ -339,7 +467,7 @@ class TaskBinarySensor(TaskCoro):
             )
         assert self.binary_sensor is not None
         if self.state_on is not None:
-            self.debug(f"Calling state_on: {self.state_on}")
+            self.debug("Calling state_on: %s", self.state_on)
             if await self.call_fce(self.state_on):
                 await self.binary_sensor.async_set_entity_state(True)
             else:
@@ -349,6 +477,7 @@ class TaskBinarySensor(TaskCoro):
 @dataclass
 class TaskLoop(TaskCoro, TaskLoopABC):
     _handler: Any = field(default=None)
+    priority: int = TASK_PRIORITY.BACKGROUND
     loop_enabled: bool = True
     loop_testing_function: Any = None
     frequence: float = 0
@@ -366,29 +495,39 @@ class TaskLoop(TaskCoro, TaskLoopABC):
             await self.reset_task_timestamp_end()
         self._loop_run = yes
         self.info(f"loop_run: {self.name} {self._loop_run}")
+        if yes and self._main_loop_started:
+            self.parent.buffer_control.loop_scheduler.add(
+                self, self._timestamp_end + self.frequence
+            )
 
     @overrides(TaskCoro)
     def set_parent(self, parent):
         super().set_parent(parent)
+        self.loop_testing_function = CallAdapter.create(self.loop_testing_function)
 
         if self.buffer_instance is not None and self.buffer_instance.main_loop_started:
             self.start_loop()
         else:
-            self.listen_handler = self.parent.listen_event(
+            self.listen_handler = self.parent.buffer_control.bus.listen(
                 self._start_loop, GEVNT.BUFFER_STARTED.value
             )
 
     def start_loop(self):
         if self._main_loop_started:
-            self.debug(f"Main loop already started {self.buffer_instance_name}")
+            self.debug("Main loop already started %s", self.buffer_instance_name)
             return
-        self.debug(f"Starting loop {self.name}")
-        self._handler = self.parent.create_task(self._main_loop())
+        self._main_loop_started = True
+        self.info(f"Starting loop {self.name} with frequence: {self.frequence}")
+        if self.frequence == 0:
+            self.warning(f"{self.name} has frequence 0")
+        # checking and execution in LoopScheduler of BufferControl
+        self.parent.buffer_control.loop_scheduler.add(self)
 
     def _start_loop(self, event, data, kwargs):
         if self.buffer_instance_name == data.get("instance", ""):
             if self.listen_handler is not None:
-                self.parent.sync_cancel_listen_event(self.listen_handler)
+                self.parent.buffer_control.bus.cancel(self.listen_handler)
+                self.listen_handler = None
             self.start_loop()
 
     async def execute(self, **kwargs):
@@ -401,26 +540,6 @@ class TaskLoop(TaskCoro, TaskLoopABC):
         await self.execute()
         self.loop_enabled = True
 
-    async def _main_loop(self):
-        """loop for overflow of time"""
-        if self._main_loop_started:
-            return
-        self._main_loop_started = True
-        self.info(f"In main_loop with frequence: {self.frequence}")
-        if self.frequence == 0:
-            self.warning(f"{self.name} has frequence 0")
-        while True:
-            if self._loop_run:
-                if self.frequence > 0:
-                    go_loop = await self._go_loop()
-                    # self.debug(f"calling go_loop {go_loop}")
-                    if go_loop is not None and go_loop:
-                        time_overflow = await self._check_time_overflow()
-                        # self.debug(f"Time overflow: {time_overflow}")
-                        if time_overflow:
-                            await self.exec_time_overflow()
-            await self.parent.sleep(1)
-
     async def _go_loop(self) -> BoolType:
         if not self.loop_enabled or self.loop_testing_function is None:
             return True
@@ -448,7 +567,7 @@ class TaskLoop(TaskCoro, TaskLoopABC):
             self.debug("Time stamp is 0")
             return True
         ultimate_end: float = await self.ultimate_end()
-        # self.debug(f"{ultimate_end} {self.frequence}")
+        # self.debug("%s %s", ultimate_end, self.frequence)
         if ultimate_end > self.frequence:
             retval = True
         return retval
@@ -456,18 +575,19 @@ class TaskLoop(TaskCoro, TaskLoopABC):
 
 @dataclass
 class TaskBtn(TaskCoro, TaskBtnABC):
+    priority: int = TASK_PRIORITY.INTERACTIVE
     expected_is_on: StateQuestionType = None
     expected_is_off: StateQuestionType = None
-    expected_on: TupleType = field(default=None)
-    expected_off: TupleType = field(default=None)
+    expected_on: CallAdapterType = field(default=None)
+    expected_off: CallAdapterType = field(default=None)
 
     input_boolean: Union[str, Tuple[str, ...]] = ""
 
     cmd_on_not_allowed: TupleType = field(default=None)
-    cmd_on_not_allowed_def: TupleType = field(default=None)
+    cmd_on_not_allowed_def: CallAdapterType = field(default=None)
 
     cmd_off_not_allowed: TupleType = field(default=None)
-    cmd_off_not_allowed_def: TupleType = field(default=None)
+    cmd_off_not_allowed_def: CallAdapterType = field(default=None)
 
     # Calling on what should be done
     execute_on_on: ExecuteFunctionType = None
@@ -499,6 +619,8 @@ class TaskBtn(TaskCoro, TaskBtnABC):
 
     def set_parent(self, parent):
         super().set_parent(parent)
+        self.execute_on_not_allowed = CallAdapter.create(self.execute_on_not_allowed)
+        self.execute_off_not_allowed = CallAdapter.create(self.execute_off_not_allowed)
 
         if isinstance(self.input_boolean, Tuple):
             for p in self.input_boolean:
@@ -528,9 +650,9 @@ class TaskBtn(TaskCoro, TaskBtnABC):
             data ([type]): [description]
         """
 
-        self.debug(f"State changed instance name: {self.name}")
-        self.debug(f"on state on do: {self.state_is_on}")
-        self.debug(f"on state off do: {self.state_is_off}")
+        self.debug("State changed instance name: %s", self.name)
+        self.debug("on state on do: %s", self.state_is_on)
+        self.debug("on state off do: %s", self.state_is_off)
         assert (
             self.buffer_instance is not None
         ), f"Buffer instance is None in {self.module_name}"
@@ -552,7 +674,7 @@ class TaskBtn(TaskCoro, TaskBtnABC):
             raise ValueError("Fatal error in core")
 
     async def _state(self, entity, attribute, old, new, kwargs):
-        self.debug(f"{entity} ignore: {self._state_ignore} ignore {new}")
+        self.debug("%s ignore: %s ignore %s", entity, self._state_ignore, new)
         if self._state_ignore:
             self._state_ignore = False
             return
@@ -594,6 +716,8 @@ class TaskParam(TaskParamABC):
     """
 
     arg: Any = None  # usualy dict for sending arguments in execute, if is missing - execute will be called without arg
+    priority: int = TASK_PRIORITY.NORMAL  # taken from task in put_in_queue
+    enqueued: float = 0  # time.monotonic() of put_in_queue
 
     async def execute(self):
         if self.task is not None:
@@ -0,0 +1,162 @@
+# Persistent values of helpers used by LastMile
+#
+# Values are kept in memory, every change is appended as one json line
+# into journal. Journal is folded into appf.yaml (same format as before -
+# EntityValues: list of {entity_id: value}) by atomic rename when
+# COMPACT_AFTER changes are collected, on load and on close.
+#
+# Crash between append and compaction is replayed from journal on load,
+# torn last line is ignored.
+#
+import json
+import os
+from typing import Any, Dict
+
+import yaml
+
+from helper_tools import MyHelp as h
+from helper_types import BoolType
+
+ENTITY_VALUES = "EntityValues"
+JOURNAL_SUFFIX = ".journal"
+COMPACT_AFTER = 500  # changes in journal to fold them into yaml
+
+
+class ValueJournal:
+    def __init__(self, filename: str, compact_after: int = COMPACT_AFTER):
+        """Persistent dictionary entity_id: value
+
+        Args:
+            filename (str): yaml file, e.g. appf.yaml
+            compact_after (int, optional): [description]. Defaults to COMPACT_AFTER.
+        """
+        self.filename = filename
+        self.journal_filename = filename + JOURNAL_SUFFIX
+        self.compact_after = compact_after
+        self.values: Dict[str, Any] = {}
+        self._journal = None
+        self._pending = 0  # appended lines since last compaction
+        self.writes = 0
+        self.compactions = 0
+
+    def load(self) -> Dict[str, Any]:
+        """Reads yaml and replays journal
+
+        Raises:
+            ValueError: yaml cannot be read
+
+        Returns:
+            Dict[str, Any]: entity_id: value
+        """
+        self.close_journal()
+        try:
+            stored_values = h.get_yaml(self.filename)
+        except Exception:
+            raise ValueError("Fatal error in declaration of stored filename")
+        values: Dict[str, Any] = {}
+        if stored_values and ENTITY_VALUES in stored_values.keys():
+            for record in stored_values[ENTITY_VALUES]:
+                entity_id = h.get_first_key_in_dict(record)
+                if entity_id is not None:
+                    values[entity_id] = record[entity_id]
+        replayed = self._replay(values)
+        self.values = values
+        if replayed:
+            # previous run did not finish compaction
+            self.compact()
+        return self.values
+
+    def _replay(self, values: Dict[str, Any]) -> bool:
+        if not os.path.exists(self.journal_filename):
+            return False
+        with open(self.journal_filename, "r") as stream:
+            for line in stream:
+                try:
+                    entity_id, value = json.loads(line)
+                except (ValueError, TypeError):
+                    # torn write by crash, only last line can be affected
+                    continue
+                values[entity_id] = value
+        return True
+
+    def get(self, entity_id: str, default: Any = None) -> Any:
+        return self.values.get(entity_id, default)
+
+    def set(self, entity_id: str, value: Any) -> BoolType:
+        """Stores value, O(1) - one line appended into journal
+
+        Args:
+            entity_id (str): [description]
+            value (Any): [description]
+
+        Raises:
+            ValueError: journal cannot be written
+
+        Returns:
+            BoolType: False if value is same as stored
+        """
+        if entity_id in self.values and self.values[entity_id] == value:
+            return False
+        self.values[entity_id] = value
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_filename, "a")
+            self._journal.write(json.dumps([entity_id, value]) + "\n")
+            self._journal.flush()
+        except Exception:
+            self.close_journal()
+            raise ValueError(f"Cannot write into {self.journal_filename}")
+        self.writes += 1
+        self._pending += 1
+        if self._pending >= self.compact_after:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Writes all values into yaml (tmp file + rename) and drops journal
+
+        Raises:
+            ValueError: yaml cannot be written
+        """
+        stored_values = {
+            ENTITY_VALUES: [
+                {entity_id: self.values[entity_id]}
+                for entity_id in sorted(self.values.keys())
+            ]
+        }
+        tmp_filename = self.filename + ".tmp"
+        try:
+            with open(tmp_filename, "w") as stream:
+                yaml.dump(
+                    stored_values, stream, indent=4, sort_keys=True, allow_unicode=True
+                )
+                stream.flush()
+                os.fsync(stream.fileno())
+            os.replace(tmp_filename, self.filename)
+        except Exception:
+            raise ValueError(f"Cannot write into {self.filename}")
+        # yaml is complete, journal is not needed any more
+        self.close_journal()
+        h.delete_file(self.journal_filename)
+        self._pending = 0
+        self.compactions += 1
+
+    def close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self):
+        """Folds pending changes into yaml"""
+        if self._pending > 0:
+            self.compact()
+        self.close_journal()
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            entities=len(self.values),
+            writes=self.writes,
+            pending=self._pending,
+            compactions=self.compactions,
+        )
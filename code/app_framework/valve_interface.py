@@ -1,3 +1,4 @@
+import asyncio
 from abc import abstractmethod
 from basic_app_sensors import AppApfSensors
 from buffer_control import BufferInterface
@@ -13,6 +14,7 @@ from helper_types import StrType
 from task_register import TaskCoro, TaskLoop
 
 LOOP_UPDATE = 30
+VALVE_CONCURRENCY = 4  # valves updated at once, args valve_concurrency
 
 
 class ValveClass(AppApfSensors, BufferInterface):
@@ -23,6 +25,9 @@ class ValveClass(AppApfSensors, BufferInterface):
     @apf_logger
     def init(self):
         self.debug("Valve Class")
+        self.valve_concurrency: int = max(
+            int(self.args.get("valve_concurrency", VALVE_CONCURRENCY)), 1
+        )
         if self.interface == INTERFACE_TYPE.UNKNOWN:
             raise ValueError(
                 "Not initialized self.interface! Must be before calling init."
@@ -77,10 +82,17 @@ class ValveClass(AppApfSensors, BufferInterface):
                     if isinstance(ventil_def, HoneywellVentil):
                         await ventil_def.nastav_dle_tlacitka()
             """
-            for ventil_def in register:
-                if isinstance(ventil_def, VentilABC):
-                    self.debug(f"valve_update_state for: {ventil_def}")
-                    await ventil_def.valve_update_state()
+            semaphore = asyncio.Semaphore(self.valve_concurrency)
+            results = await asyncio.gather(
+                *(
+                    self._valve_update_state(semaphore, ventil_def)
+                    for ventil_def in register
+                    if isinstance(ventil_def, VentilABC)
+                )
+            )
+            failed = results.count(False)
+            if failed > 0:
+                self.warning("Valve update failed for %s of %s", failed, len(results))
 
         except Exception as ex:
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
@@ -88,6 +100,25 @@ class ValveClass(AppApfSensors, BufferInterface):
             self.error(message)
         return True
 
+    async def _valve_update_state(
+        self, semaphore: asyncio.Semaphore, ventil_def: VentilABC
+    ) -> bool:
+        """Update of one valve, error does not stop others
+
+        Returns:
+            bool: False in case of exception
+        """
+        async with semaphore:
+            try:
+                self.debug("valve_update_state for: %s", ventil_def)
+                await ventil_def.valve_update_state()
+                return True
+            except Exception as ex:
+                template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                message = template.format(type(ex).__name__, ex.args)
+                self.error(f"Valve {ventil_def.name_id}: {message}")
+                return False
+
     def _event_set_operating_mode(self, event, data, kwargs):
         device_id: StrType = data.get("device_id")
         valve_operation_value: StrType = data.get("operation")
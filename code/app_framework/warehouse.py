@@ -2,7 +2,7 @@
 from typing import Any
 from bootstart import boot_logger, boot_module
 import hassapi as hass  # type:ignore
-from helper_types import ListStr, RegisterType
+from helper_types import IndexedRegister, ListStr, RegisterType
 from helper_tools import INDEX_KEY, STORED, MyHelp as h
 import globals as g
 from globals_def import eventsDef as e
@@ -15,12 +15,14 @@ class Warehouse(hass.Hass):
     @boot_logger
     @boot_module
     def initialize(self):
-        self._container: RegisterType = []
+        self._container: RegisterType = IndexedRegister()
 
     def init(self):
         self.logger.debug("Init")
 
-    def register_container(self, name: str, container: RegisterType = []):
+    def register_container(self, name: str, container: RegisterType = None):
+        if container is None:
+            container = IndexedRegister()
         if not h.stored_exists(name, self._container):
             h.stored_push(name, self._container, container)
 
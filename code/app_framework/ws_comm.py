@@ -6,24 +6,32 @@
 # Dokumentace na
 # https://websocket-client.readthedocs.io/en/latest/examples.html
 #
+# Transport is chosen in ws_comm.yaml (transport: async | executor), see ws_transport
+#
 
 from dataclasses import dataclass, field
 from apd_types import ApHass
 
 
 import json
-import websocket  # type: ignore
 from helper_tools import INDEX_KEY, MyHelp as h, STORED
 from helper_types import (
     CallableType,
     DictType,
-    IntType,
     StrType,
 )
-from typing import Union
+from typing import Any, Callable, Dict, Union
 from private import Private
 from bootstart import boot_logger, boot_logger_off, boot_module
+from state_mirror import STATE_CHANGED, StateMirror, StateMirrorType
+import globals as g
+from ws_transport import (
+    TRANSPORT_EXECUTOR,
+    WsTransportType,
+    create_transport,
+)
 import asyncio
+import time
 
 
 class ws_error:
@@ -33,9 +41,33 @@ class ws_error:
     AUTH_REQUIRED = "Authorization asked"
     OPEN = "open_error"
     NOT_PREPARED = "NOT_PREPARED"
+    SEND = "error during send"
+
+
+WINDOW = 10  # default amount of commands waiting for result (ws_comm.yaml window)
+PING_INTERVAL = 30  # [s] keepalive, ws_comm.yaml ping_interval (0 - off)
+PING_TIMEOUT = 10  # [s] missing pong - connection is closed
+RECONNECT_MIN = 1  # [s] first delay of reconnect, doubled every attempt
+RECONNECT_MAX = 60  # [s] ws_comm.yaml reconnect_max
 
 
-MAX_BATCH = 10
+@dataclass
+class WsStats:
+    """Counters of WsHA connection, WsHA.stats"""
+
+    connects: int = 0
+    reconnects: int = 0
+    failed_connects: int = 0
+    handshake_last: float = 0  # [s] connect + auth
+    handshake_total: float = 0
+    pings: int = 0
+    ping_timeouts: int = 0
+
+    @property
+    def handshake_avg(self) -> float:
+        if self.connects == 0:
+            return 0
+        return self.handshake_total / self.connects
 
 
 @dataclass
@@ -55,6 +87,8 @@ class Cmd:
     finished: bool = False
     error_code: str = ""
     _cmd_json: StrType = None
+    _future: Any = field(default=None, repr=False)
+    event_callback: CallableType = None  # subscription - called with every event
 
     @property
     def cmd_json(self) -> str:
@@ -86,7 +120,26 @@ class Cmd:
         self.repeat = False
         self.error_code = ""
         self.finished = False
-        self.result.clear()
+        if self.result is not None:
+            self.result.clear()
+
+    def set_finished(self):
+        """Called by WsHA when result arrived or command failed"""
+        self.finished = True
+        if self._future is not None and not self._future.done():
+            self._future.set_result(self)
+
+    async def wait(self) -> "Cmd":
+        """Awaiting result instead of polling finished
+
+        Returns:
+            Cmd: self with result, error_code etc.
+        """
+        if self.finished:
+            return self
+        if self._future is None:
+            self._future = asyncio.get_running_loop().create_future()
+        return await self._future
 
 
 CmdType = Union[None, Cmd]
@@ -102,7 +155,30 @@ class WsHA(ApHass):
         self._cmd_register: dict = {}
         self.end_callback = end_callback
         self._finished = False
-        self._ws = None
+        self._ws: WsTransportType = None
+        # ws_comm.yaml - transport: async | executor
+        self._transport_kind: str = h.par(self.args, "transport", TRANSPORT_EXECUTOR)
+        # ws_comm.yaml - window: how many commands can wait for result
+        self._window: int = int(h.par(self.args, "window", WINDOW))
+        self._pending: Dict[int, Cmd] = {}  # sent commands by id
+        self._reader_handler: Any = None
+        self._keepalive_handler: Any = None
+        # ws_comm.yaml - ping_interval, reconnect_max [s]
+        self._ping_interval: float = float(
+            h.par(self.args, "ping_interval", PING_INTERVAL)
+        )
+        self._reconnect_max: float = float(
+            h.par(self.args, "reconnect_max", RECONNECT_MAX)
+        )
+        self._pings: Dict[int, Any] = {}  # id: future of pong
+        self.stats = WsStats()
+        self._subscriptions: Dict[int, Callable] = {}  # id: event_callback
+        self._connect_lock: Any = None
+        # ws_comm.yaml - state_mirror: true
+        self.mirror: StateMirrorType = None
+        if h.yes(h.par(self.args, "state_mirror", False)):
+            self.mirror = StateMirror()
+        g.state_mirror = self.mirror
         self._used_id: int = 0
         self.connection_error: bool = False
         self.fatal_error: bool = False
@@ -125,101 +201,242 @@ class WsHA(ApHass):
         self._main_loop_handler = self.create_task(self.main_loop())
 
     @property
-    def _generator_type_id(self) -> IntType:
+    def _generator_type_id(self) -> int:
+        # HA needs increasing id within connection, it is never reset
         self._used_id += 1
-        if self._used_id > MAX_BATCH:
-            return None
-        else:
-            return self._used_id
+        return self._used_id
 
     def _end_main_loop(self, *kwargs):
-        try:
-            if self._main_loop_handler is not None:
-                self._main_loop_handler.cancel()  # type: ignore
-        except:
-            pass
+        for handler in ("_main_loop_handler", "_reader_handler", "_keepalive_handler"):
+            try:
+                if getattr(self, handler, None) is not None:
+                    getattr(self, handler).cancel()
+            except:
+                pass
 
     def terminate(self):
         self._done()
+        g.state_mirror = None
 
     def _done(self):
         self._end_main_loop()
         self.ws_close()
 
     async def main_loop(self):
+        """Sending commands, results are collected in _reader
+
+        Up to self._window commands are sent without waiting for result.
+        """
         self._buffer = asyncio.Queue()
-        success: bool = False
+        self._window_slots = asyncio.Semaphore(self._window)
+        self._connect_lock = asyncio.Lock()
 
         # signal to bootstart - done
         self.end_callback(self)
+        if self.mirror is not None:
+            await self.create_task(self._connect())
 
-        self.info("Loop!")
-        cmd: CmdType
+        self.info(f"Loop! window: {self._window}")
+        cmd: Cmd
         while True:
-            unique_id = await self._buffer.get()
-            cmd = self._cmd_register.get(unique_id)
-
-            if cmd is None:
-                raise ValueError("Wrong cmd")
-            else:
-                self.debug(f"Sending {cmd.cmd_json}")
-                success = await self._send_recieve_direct(cmd)
-                self.debug(f"command received {cmd.raw}")
-                cmd.finished = True
-            h.remove_key(self._cmd_register, unique_id)
-
+            cmd = await self._buffer.get()
+            await self._window_slots.acquire()
+            try:
+                sent = await self._send(cmd)
+            except Exception as ex:
+                template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                self.error(template.format(type(ex).__name__, ex.args))
+                cmd.error_code = ws_error.NOT_PREPARED
+                sent = False
+            if not sent:
+                self._window_slots.release()
+                self.error(f"Mistake in communication {cmd.error_code}")
+                self._finish(cmd)
             self._buffer.task_done()
-            """
-            if not success:
-                self._done()
-            """
 
-    async def _async_send(self, data):
-        if self._ws is not None:
-            self.debug(f"In executor: {data}")
-            retval = await self.run_in_executor(self._ws.send, data)
-            return retval
-        return None
+    async def _send(self, cmd: Cmd) -> bool:
+        """Sending command, result is routed by id in _reader
 
-    async def _async_get_recv(self):
-        if self._ws is not None:
-            retval = await self.run_in_executor(self._ws.recv)
-            return retval
-        return None
+        Args:
+            cmd (Cmd): [description]
 
-    async def _get_recv(self, cmd: Cmd) -> None:
+        Returns:
+            bool: True if was sent or already finished by _reader, False -
+                window slot and finishing stay with caller
+        """
+        self.debug("Prepare %s", cmd.cmd_data)
+        if not await self.prepare_for_send(cmd):
+            if len(cmd.error_code) == 0:
+                cmd.error_code = ws_error.NOT_PREPARED
+            return False
         if self._ws is None:
-            self.debug("None")
             cmd.error_code = ws_error.NOT_OPEN
-            return
-        cmd.raw = await self._async_get_recv()
-        self.debug(f"Raw:{cmd.raw}")
-        if cmd.raw is None:
-            cmd.error_code = ws_error.RECEIVE_EMPTY_RAW
-            return
-        cmd.received = True
+            return False
+        self._pending[cmd.id] = cmd
+        if cmd.event_callback is not None:
+            # events can arrive right after result
+            self._subscriptions[cmd.id] = cmd.event_callback
+        try:
+            await self._async_send(cmd.cmd_json)
+        except Exception as ex:
+            if self._pop_pending(cmd.id) is None:
+                # connection dropped - _fail_pending released slot and finished cmd
+                return True
+            self._subscriptions.pop(cmd.id, None)
+            cmd.error_code = f"{ws_error.SEND} {type(ex).__name__}"
+            return False
+        # Marking that it was sent
+        cmd.sent = True
+        return True
+
+    def _pop_pending(self, id: Any) -> Union[Cmd, None]:
+        return self._pending.pop(id, None)
 
+    def _finish(self, cmd: Cmd):
+        if self._cmd_register.get(cmd.unique_id) is cmd:
+            h.remove_key(self._cmd_register, cmd.unique_id)
+        cmd.set_finished()
+
+    async def _reader(self, ws: Any):
+        """Only one reader for connection - routing results to Cmd by id"""
+        while True:
+            try:
+                raw = await ws.recv()
+            except Exception as ex:
+                self.error(f"Receive {type(ex).__name__}: {ex.args}")
+                raw = None
+            if raw is None:
+                break
+            self._route(raw)
+        self.debug("Connection closed")
+        if self._ws is ws:
+            self.ws_close()
+        if self.mirror is not None and self._ws is None:
+            # mirror has to be renewed without waiting for next command
+            await self.create_task(self._connect())
+
+    def _fail_pending(self):
+        """Sent commands of closed connection never get result"""
+        for id in list(self._pending.keys()):
+            cmd = self._pop_pending(id)
+            if cmd is not None:
+                cmd.error_code = ws_error.RECEIVE_EMPTY_RAW
+                self._window_slots.release()
+                self._finish(cmd)
+
+    def _route(self, raw: str):
         try:
-            cmd.cmd_json = json.loads(cmd.raw)  # type: ignore
+            data = json.loads(raw)
         except:
-            cmd.error_code = ws_error.NOT_JSON
+            self.error(f"{ws_error.NOT_JSON}: {raw}")
             return
-
-        auth = cmd.cmd_json.get("type", "")
-        if auth == "auth_required":
-            cmd.error_code = ws_error.AUTH_REQUIRED
+        if data.get("type") == "event":
+            callback = self._subscriptions.get(data.get("id"))
+            if callback is not None:
+                try:
+                    callback(data.get("event"))
+                except Exception as ex:
+                    template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+                    self.error(template.format(type(ex).__name__, ex.args))
             return
+        pong = self._pings.pop(data.get("id"), None)
+        if pong is not None:
+            if not pong.done():
+                pong.set_result(True)
+            return
+        cmd = self._pop_pending(data.get("id"))
+        if cmd is None:
+            self.warning(f"Received unknown id: {raw}")
+            return
+        self._window_slots.release()
+        cmd.raw = raw
+        cmd.received = True
+        cmd.cmd_json = data
+        cmd.result = data.get("result")
+        # result is null e.g. for subscribe_events or delete
+        cmd.success = data.get("success", False)
+        if not cmd.success:
+            cmd.error_code = str(h.par(data, "error", ""))
+        self.debug("command received %s", cmd.raw)
+        self._finish(cmd)
+
+    async def _keepalive(self, ws: Any):
+        """HA ping message, without pong in PING_TIMEOUT connection is closed"""
+        while self._ws is ws:
+            await self.sleep(self._ping_interval)
+            if self._ws is not ws:
+                break
+            id = self._generator_type_id
+            pong = asyncio.get_running_loop().create_future()
+            self._pings[id] = pong
+            self.stats.pings += 1
+            try:
+                await ws.send(json.dumps({"id": id, "type": "ping"}))
+                await asyncio.wait_for(pong, PING_TIMEOUT)
+            except Exception as ex:
+                self._pings.pop(id, None)
+                self.stats.ping_timeouts += 1
+                self.warning(f"Keepalive failed {type(ex).__name__}, closing connection")
+                if self._ws is ws:
+                    self.ws_close()
+                break
+
+    async def _connect(self) -> bool:
+        """Opening connection, repeated with exponential backoff
+
+        Command waiting for connection stays in queue, as well as unsent ones.
+
+        Returns:
+            bool: False only if connection can not be opened at all (token)
+        """
+        async with self._connect_lock:
+            delay: float = RECONNECT_MIN
+            while True:
+                if await self._check_connection():
+                    return True
+                if self.fatal_error:
+                    return False
+                self.stats.failed_connects += 1
+                self.warning(f"Connection failed, next attempt in {delay}s")
+                await self.sleep(delay)
+                delay = min(delay * 2, self._reconnect_max)
 
-        id: StrType = str(h.par(cmd.cmd_json, "id", None))
-        if id is None:
-            cmd.error_code = "return id None"
+    async def _seed_mirror(self):
+        """Subscription first, then get_states - no change is lost between
+
+        Events routed before the snapshot is seeded are buffered in mirror
+        and replayed over it.
+        """
+        if self.mirror is None:
             return
-        if int(id) != cmd.id:
-            cmd.error_code = f"id returned {id}, should be: {cmd.id}"
+        start = time.perf_counter()
+        self.mirror.begin_seed()
+        subscription = self.subscribe_events(STATE_CHANGED, self.mirror.apply_event)
+        states = self.get_states()
+        if not (await subscription.wait()).success:
+            self.error(f"Mirror subscription failed {subscription.error_code}")
+            self.mirror.invalidate()
             return
-        cmd.result = cmd.cmd_json.get("result")
-        if cmd.result is not None:
-            cmd.success = cmd.cmd_json.get("success", False)
+        await states.wait()
+        if not states.success or states.result is None:
+            self.error(f"Mirror get_states failed {states.error_code}")
+            self.mirror.invalidate()
+            return
+        self.mirror.seed(states.result)
+        self.info(
+            f"Mirror seeded {len(self.mirror)} entities in {(time.perf_counter() - start) * 1000:.0f} ms {self.mirror.stats}"
+        )
+
+    async def _async_send(self, data):
+        if self._ws is not None:
+            self.debug("Sending: %s", data)
+            await self._ws.send(data)
+        return None
+
+    async def _async_get_recv(self):
+        if self._ws is not None:
+            return await self._ws.recv()
+        return None
 
     @property
     def ws_url(self):
@@ -237,13 +454,21 @@ class WsHA(ApHass):
             if self._ws is not None:
                 self._ws.close()
         self._ws = None
-        self._used_id = 0
+        for pong in getattr(self, "_pings", {}).values():
+            if not pong.done():
+                pong.cancel()
+        if hasattr(self, "_subscriptions"):
+            self._subscriptions.clear()
+        if getattr(self, "mirror", None) is not None:
+            self.mirror.invalidate()
+        if len(getattr(self, "_pending", {})) > 0:
+            self._fail_pending()
 
     async def _check_connection(self) -> bool:
         self.debug("Checking connection inside")
         retval: bool = False
         if self.fatal_error:
-            self.error("Fatal - token missing")
+            self.error("Fatal - token missing or rejected")
             return retval
 
         # if was connecion
@@ -259,53 +484,75 @@ class WsHA(ApHass):
         self.connection_error = False
 
         # part of opening connection
-        self.debug(f"Checking connection inside here {self.ws_url}")
+        self.debug("Checking connection inside here %s", self.ws_url)
+        start = time.perf_counter()
         try:
-            self._ws = websocket.create_connection(self.ws_url)
-        except TimeoutError:
+            self._ws = create_transport(self._transport_kind, self.run_in_executor)
+            await self._ws.connect(self.ws_url)
+        except Exception as ex:
             self._ws = None
             self.connection_error = True
-            self.error("Timeout error connection")
+            self.error(f"Error connection {type(ex).__name__}: {ex.args}")
             return False
-        if self._ws is None:
-            self.error("Nemam connection")
+        try:
+            self.debug("Asking for recv")
+            recv = await self._async_get_recv()  # asking for authorization
+            self.info(f"open received: {recv}")
+            if recv is None:
+                raise ConnectionError(ws_error.RECEIVE_EMPTY_RAW)
+            auth = h.par(json.loads(recv), "type", "")
+            if auth != "auth_required":
+                raise ConnectionError(f"Unexpected first message {auth}")
+
+            auth = {"type": "auth", "access_token": self.at}
+            self.debug("Sending auth")
+            await self._async_send(json.dumps(auth))
+            recv = await self._async_get_recv()
+            self.debug("Recieved%s", recv)
+            if recv is None:
+                raise ConnectionError(ws_error.RECEIVE_EMPTY_RAW)
+            auth_result: str = h.par(json.loads(recv), "type", "")
+        except Exception as ex:
+            # connection lost or garbage, next attempt by backoff
+            self.ws_close()
+            self.connection_error = True
+            template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+            self.error(template.format(type(ex).__name__, ex.args))
             return False
-        self.debug(f"Asking for recv")
-        recv = await self._async_get_recv()  # asking for authorization
-        self.info(f"open received: {recv}")
-
-        if recv is None:
+        if auth_result == "auth_invalid":
+            self.ws_close()
+            self.error("Error in authentication")
+            # token rejected - no sense to repeat, reconnecting stops
+            self.fatal_error = True
+            return False
+        if auth_result != "auth_ok":
+            self.ws_close()
             self.connection_error = True
+            self.error(f"Unexpected authentication result {auth_result}")
             return False
-        retval = json.loads(recv)
-        auth = h.par(retval, "type", "")
-        if auth != "auth_required":
-            self.warning("Error in authentication")
-            raise ValueError("Error in authentication")
-
-        auth = {"type": "auth", "access_token": self.at}
-        self.debug("Sending auth")
-        await self._async_send(json.dumps(auth))
-        recv = await self._async_get_recv()
-        self.debug(f"Recieved{recv}")
-        ret = None
-
-        auth_result: str = ""
-        if recv is not None:
-            ret = json.loads(recv)
-            auth_result = h.par(ret, "type", "")
-        if ret is None or auth_result != "auth_ok":
-            self._close_connection()
-            self.warning("Error in authentication")
-            raise ValueError("Error in authentication")
-        else:
-            retval = True
+        retval = True
+        handshake = time.perf_counter() - start
+        if self.stats.connects > 0:
+            self.stats.reconnects += 1
+        self.stats.connects += 1
+        self.stats.handshake_last = handshake
+        self.stats.handshake_total += handshake
+        self.info(
+            f"Connected in {handshake * 1000:.0f} ms, reconnects: {self.stats.reconnects}"
+        )
+        # from now every received frame goes via _reader
+        self._reader_handler = await self.create_task(self._reader(self._ws))
+        if self._ping_interval > 0:
+            self._keepalive_handler = await self.create_task(self._keepalive(self._ws))
+        if self.mirror is not None:
+            # commands are sent by main_loop, can not wait here
+            await self.create_task(self._seed_mirror())
         return retval
 
     def register_cmd(self, cmd: Cmd):
         self.debug("Registering")
         self._cmd_register[cmd.unique_id] = cmd
-        self._buffer.put_nowait(cmd.unique_id)
+        self._buffer.put_nowait(cmd)
         return cmd
 
     async def async_register_cmd(self, cmd: Cmd):
@@ -318,7 +565,7 @@ class WsHA(ApHass):
             [type]: [description]
         """
         self._cmd_register[cmd.unique_id] = cmd
-        await self._buffer.put(cmd.unique_id)
+        await self._buffer.put(cmd)
         return cmd
 
     async def delete_entity(self, entity_id: str):
@@ -327,72 +574,56 @@ class WsHA(ApHass):
         key = domain + "_id"
         cmd_data.update({key: name})
         cmd: Cmd = Cmd(h.get_id(), cmd_data=cmd_data)
-        self.debug(f"Asking: {cmd_data}")
+        self.debug("Asking: %s", cmd_data)
         await self.async_register_cmd(cmd)
 
-    def get_entities(self, domain: str) -> Cmd:
-        """Return list of entities
+    def subscribe_events(self, event_type: str, callback: Callable) -> Cmd:
+        """Subscription valid till connection is closed
 
         Args:
-            domain (str): [description]
+            event_type (str): e.g. state_changed
+            callback (Callable): called with event part of message
 
         Returns:
-            dict: [description]
+            Cmd: [description]
         """
-
-        to_send = dict(type=domain + "/list")
-        cmd: Cmd = Cmd(h.get_id(), cmd_data=to_send)
-        self.debug(f"Asking: {to_send}")
+        to_send = dict(type="subscribe_events", event_type=event_type)
+        cmd: Cmd = Cmd(h.get_id(), cmd_data=to_send, event_callback=callback)
         self.register_cmd(cmd)
         return cmd
 
-    async def prepare_for_send(self, cmd: Cmd) -> bool:
-        # Checking - opening / close connection
-        id: IntType = self._generator_type_id
-        if id is None:
-            self.ws_close()
-        if self._ws is None:
-            self.debug(f"Checking connection")
-            retval = await self._check_connection()
-            if retval:
-                id = self._generator_type_id
-                if id is None:
-                    self.error("Fatal in generator")
-                    return False
-        if id is not None:
-            cmd.update_id(id)
-            return True
-        else:
-            return False
+    def get_states(self) -> Cmd:
+        """All states, result is list of state objects
 
-    async def _send_recieve_direct(self, cmd: Cmd) -> bool:
-        """Called from MainLoop
+        Returns:
+            Cmd: [description]
+        """
+        cmd: Cmd = Cmd(h.get_id(), cmd_data=dict(type="get_states"))
+        self.register_cmd(cmd)
+        return cmd
+
+    def get_entities(self, domain: str) -> Cmd:
+        """Return list of entities
 
         Args:
-            cmd (Cmd): [description]
+            domain (str): [description]
 
         Returns:
-            Any: [description]
+            dict: [description]
         """
 
-        self.debug(f"Prepare {cmd.cmd_data}")
-
-        # if return None - it means it is necessary close and re_open
-        prepared: bool = await self.prepare_for_send(cmd)
-        if not prepared:
-            return False
-        if self._ws is None:
-            return False
-        # self.debug(f"done {cmd}")
-        # self.debug(f"done {cmd.cmd_json}")
-        await self._async_send(cmd.cmd_json)
-
-        # Marking that it was sent
-        cmd.sent = True
-        self.debug(f"Was sent {cmd.cmd_json}")
+        to_send = dict(type=domain + "/list")
+        cmd: Cmd = Cmd(h.get_id(), cmd_data=to_send)
+        self.debug("Asking: %s", to_send)
+        self.register_cmd(cmd)
+        return cmd
 
-        await self._get_recv(cmd)
-        if len(cmd.error_code) > 0:
-            self.error(f"Mistake in communication {cmd.error_code}")
-            return False
+    async def prepare_for_send(self, cmd: Cmd) -> bool:
+        # Checking - opening connection, it stays open
+        if self._ws is None or not self._ws.connected:
+            self.debug("Checking connection")
+            if not await self._connect():
+                cmd.error_code = ws_error.NOT_OPEN
+                return False
+        cmd.update_id(self._generator_type_id)
         return True
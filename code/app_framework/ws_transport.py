@@ -0,0 +1,170 @@
+# WebSocket transports used by WsHA (ws_comm)
+#
+# ExecutorTransport - blocking websocket-client, every frame goes via executor
+# AsyncTransport    - aiohttp (shipped with AppDaemon), runs on the event loop
+#
+# https://docs.aiohttp.org/en/stable/client_reference.html#client-websocket-response
+#
+from abc import ABC, abstractmethod
+import asyncio
+from typing import Any, Callable, Union
+
+import aiohttp  # type: ignore
+import websocket  # type: ignore
+
+from helper_types import StrType
+
+TRANSPORT_ASYNC = "async"
+TRANSPORT_EXECUTOR = "executor"
+
+
+class WsTransport(ABC):
+    """Minimal awaitable connection used by WsHA"""
+
+    @property
+    @abstractmethod
+    def connected(self) -> bool:
+        ...
+
+    @abstractmethod
+    async def connect(self, url: str) -> None:
+        ...
+
+    @abstractmethod
+    async def send(self, data: str) -> None:
+        ...
+
+    @abstractmethod
+    async def recv(self) -> StrType:
+        """Returns received frame, None if connection is closed"""
+        ...
+
+    @abstractmethod
+    async def aclose(self) -> None:
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        """Can be called also outside of event loop (terminate)"""
+        ...
+
+
+class ExecutorTransport(WsTransport):
+    """Original way - blocking websocket-client, each call in executor"""
+
+    def __init__(self, run_in_executor: Callable):
+        self._run_in_executor = run_in_executor
+        self._ws: Any = None
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and self._ws.connected
+
+    async def connect(self, url: str) -> None:
+        self._ws = await self._run_in_executor(websocket.create_connection, url)
+
+    async def send(self, data: str) -> None:
+        if self._ws is not None:
+            await self._run_in_executor(self._ws.send, data)
+
+    async def recv(self) -> StrType:
+        if self._ws is None:
+            return None
+        try:
+            return await self._run_in_executor(self._ws.recv)
+        except (websocket.WebSocketException, OSError):
+            # closed - also from other side during blocking recv
+            return None
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        ws = self._ws
+        self._ws = None
+        if ws is None:
+            return
+        try:
+            # wakes up recv blocked in executor, close would wait for it
+            ws.abort()
+            ws.close(timeout=0)
+        except (websocket.WebSocketException, OSError):
+            pass
+
+
+class AsyncTransport(WsTransport):
+    """Native asyncio transport, no thread hop per frame"""
+
+    def __init__(self):
+        self._session: Any = None
+        self._ws: Any = None
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    async def connect(self, url: str) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        # get_states etc. can be bigger than default 4MB
+        self._ws = await self._session.ws_connect(url, max_msg_size=0)
+
+    async def send(self, data: str) -> None:
+        if self._ws is not None:
+            await self._ws.send_str(data)
+
+    async def recv(self) -> StrType:
+        if self._ws is None:
+            return None
+        msg = await self._ws.receive()
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            return msg.data
+        return None
+
+    async def aclose(self) -> None:
+        ws, session = self._ws, self._session
+        self._ws = None
+        self._session = None
+        if ws is not None:
+            await ws.close()
+        if session is not None:
+            await session.close()
+
+    def close(self) -> None:
+        if self._ws is None and self._session is None:
+            return
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._ws = None
+            self._session = None
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(self.aclose())
+        else:
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop)
+
+
+WsTransportType = Union[WsTransport, None]
+
+
+def create_transport(kind: str, run_in_executor: Callable) -> WsTransport:
+    """Returns transport according ws_comm.yaml parameter transport
+
+    Args:
+        kind (str): TRANSPORT_ASYNC or TRANSPORT_EXECUTOR
+        run_in_executor (Callable): awaitable run_in_executor of app
+
+    Returns:
+        WsTransport: [description]
+    """
+    if kind == TRANSPORT_EXECUTOR:
+        return ExecutorTransport(run_in_executor)
+    elif kind == TRANSPORT_ASYNC:
+        return AsyncTransport()
+    raise ValueError(f"Unknown transport: {kind}")
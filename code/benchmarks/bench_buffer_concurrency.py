@@ -0,0 +1,112 @@
+""" Benchmark of BufferInstance max_concurrency
+
+TASKS independent tasks, each waiting DELAY seconds (e.g. cloud api call),
+are put in one BufferInstance and time to finish all of them is measured.
+
+Run (AppDaemon installed):
+    python bench_buffer_concurrency.py [tasks] [delay]
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from buffer_control import EventBus  # noqa: E402
+from buffer_instance import BufferInstance, TaskQueue  # noqa: E402
+from task_register import TaskCoro, TaskParam  # noqa: E402
+
+TASKS = 16
+DELAY = 0.2
+CONCURRENCY = (1, 2, 4, 8)
+
+
+class Parent:
+    """Minimal BufferControl / BufferInterface for BufferInstance and TaskCoro"""
+
+    global_vars: dict = {}
+    register: list = []
+
+    def __init__(self):
+        self.buffer_control = self
+        self.bus = EventBus(self)
+
+    async def now(self) -> float:
+        return time.time()
+
+    async def create_task(self, coro, callback=None, **kwargs):
+        return asyncio.get_running_loop().create_task(coro)
+
+    async def sleep(self, delay):
+        await asyncio.sleep(delay)
+
+    async def fire_event(self, event, **kwargs):
+        pass
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+    def debug(self, msg, *args):
+        pass
+
+    info = warning = error = debug
+    debug_on = False
+
+
+class App:
+    """Owner of task coroutines - TaskCoro calls methods"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def slow_io(self):
+        await asyncio.sleep(self.delay)
+
+
+async def measure(tasks: int, delay: float, concurrency: int) -> float:
+    parent = Parent()
+    app = App(delay)
+    instance = BufferInstance(
+        parent, "bench", max_concurrency=concurrency  # type: ignore
+    )
+    instance._command_buffer = TaskQueue()
+    main_loop = asyncio.create_task(instance.main_loop())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for i in range(tasks):
+        task = TaskCoro(reg_name=f"task_{i}", coro=app.slow_io)
+        task.parent = parent  # type: ignore
+        await instance.put_in_queue(TaskParam(task=task, name=task.name))
+    await instance.join()
+    elapsed = time.perf_counter() - start
+    main_loop.cancel()
+    return elapsed
+
+
+async def main(tasks: int, delay: float):
+    print(f"{tasks} tasks, {delay}s each")
+    base = 0.0
+    for concurrency in CONCURRENCY:
+        elapsed = await measure(tasks, delay, concurrency)
+        base = base or elapsed
+        print(
+            f"    max_concurrency {concurrency}: {elapsed:6.2f} s"
+            f"  {tasks / elapsed:6.1f} tasks/s  speedup {base / elapsed:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else TASKS,
+            float(sys.argv[2]) if len(sys.argv) > 2 else DELAY,
+        )
+    )
@@ -0,0 +1,104 @@
+""" Benchmark of BufferInstance queue throughput with debug logging off
+
+TASKS trivial tasks are put in one BufferInstance, parent logger is on level
+INFO (production setup). Compared is debug_on flag cached by logger
+decorators against asking logger for every debug message.
+
+Run (AppDaemon installed):
+    python bench_buffer_debug.py [tasks]
+"""
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from buffer_control import EventBus  # noqa: E402
+from buffer_instance import BufferInstance, TaskQueue  # noqa: E402
+from task_register import TaskCoro, TaskParam  # noqa: E402
+
+TASKS = 20000
+
+
+class Parent:
+    """Minimal BufferControl / BufferInterface with real logger"""
+
+    global_vars: dict = {}
+    register: list = []
+
+    def __init__(self, level: int, debug_on: bool):
+        self.logger = logging.getLogger(f"bench_buffer_debug_{level}_{debug_on}")
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+        self.logger.setLevel(level)
+        self.debug_on = debug_on
+        self.debug = self.logger.debug
+        self.info = self.logger.info
+        self.warning = self.logger.warning
+        self.error = self.logger.error
+        self.buffer_control = self
+        self.bus = EventBus(self)
+
+    async def now(self) -> float:
+        return time.time()
+
+    async def create_task(self, coro, callback=None, **kwargs):
+        return asyncio.get_running_loop().create_task(coro)
+
+    async def sleep(self, delay):
+        await asyncio.sleep(delay)
+
+    async def fire_event(self, event, **kwargs):
+        pass
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+
+class App:
+    """Owner of task coroutines - TaskCoro calls methods"""
+
+    async def quick(self):
+        pass
+
+
+async def measure(tasks: int, parent: Parent) -> float:
+    app = App()
+    instance = BufferInstance(parent, "bench")  # type: ignore
+    instance._command_buffer = TaskQueue()
+    main_loop = asyncio.create_task(instance.main_loop())
+    await asyncio.sleep(0)
+    # distinct names - same waiting task is coalesced in queue
+    task_list = [TaskCoro(reg_name=f"task_{i}", coro=app.quick) for i in range(tasks)]
+    start = time.perf_counter()
+    for task in task_list:
+        task.parent = parent  # type: ignore
+        await instance.put_in_queue(TaskParam(task=task, name=task.name))
+    await instance.join()
+    elapsed = time.perf_counter() - start
+    main_loop.cancel()
+    return tasks / elapsed
+
+
+async def main(tasks: int):
+    print(f"{tasks} tasks")
+    for name, level, debug_on in (
+        ("level DEBUG", logging.DEBUG, True),
+        ("level INFO, asking logger", logging.INFO, True),
+        ("level INFO, debug_on cached", logging.INFO, False),
+    ):
+        rate = await measure(tasks, Parent(level, debug_on))
+        print(f"    {name:>28}: {rate:10.0f} tasks/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else TASKS))
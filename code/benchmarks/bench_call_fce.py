@@ -0,0 +1,107 @@
+""" Benchmark of TaskBase.call_fce - former inspecting of every call vs CallAdapter
+
+Run (AppDaemon installed):
+    python bench_call_fce.py [calls]
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+from types import FunctionType
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from helper_tools import MyHelp as h  # noqa: E402
+from task_register import CallAdapter, TaskCoro  # noqa: E402
+
+CALLS = 100000
+
+
+class Parent:
+    """Executor is called directly - the cost of thread pool is not measured"""
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+    def debug(self, msg, *args):
+        pass
+
+    info = warning = error = debug
+    debug_on = False
+
+
+class App:
+    def is_state(self, question):
+        return True
+
+    async def async_is_state(self, question):
+        return True
+
+
+def function(question):
+    return True
+
+
+async def former_call_fce(task: TaskCoro, called: tuple):
+    """TaskBase.call_fce before CallAdapter"""
+    investigate, param_call = called
+    if investigate is None:
+        task.error("Asking to call None in call_fce")
+        return
+    task.debug(f"For investigate: {investigate}, {param_call}")
+    if h.is_async(investigate):
+        to_call = task.get_courotine(investigate=investigate, param_call=param_call)
+        if to_call is None:
+            return None
+        else:
+            await to_call
+    else:
+        if isinstance(investigate, FunctionType):
+            if param_call is None:
+                return investigate()
+            else:
+                return investigate(param_call)
+        else:
+            if param_call is None:
+                return await task.parent.run_in_executor(investigate)
+            else:
+                return await task.parent.run_in_executor(investigate, param_call)
+
+
+async def measure(call, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    return calls / (time.perf_counter() - start)
+
+
+async def main(calls: int):
+    app = App()
+    task = TaskCoro(reg_name="bench")
+    task.parent = Parent()  # type: ignore
+    print(f"{calls} calls")
+    for name, fce in (
+        ("sync method", app.is_state),
+        ("async method", app.async_is_state),
+        ("function", function),
+    ):
+        called = (fce, "on")
+        adapter = CallAdapter.create(called)
+        former = await measure(lambda: former_call_fce(task, called), calls)
+        tuple_call = await measure(lambda: task.call_fce(called), calls)
+        adapter_call = await measure(lambda: task.call_fce(adapter), calls)
+        print(
+            f"{name:>13}: former {former:10.0f}/s  tuple {tuple_call:10.0f}/s"
+            f"  adapter {adapter_call:10.0f}/s  speedup {adapter_call / former:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else CALLS))
@@ -0,0 +1,108 @@
+""" Benchmark of EntityRegister.execute - Sanitarize step listing helpers
+
+Fake ws_comm answers <domain>/list after LATENCY seconds with HELPERS
+helpers per domain. Serial ws_comm answers one list at a time - lists
+awaited one after another as before. Concurrent ws_comm answers lists in
+parallel as pipelined websocket does.
+
+Run (AppDaemon installed):
+    python bench_entity_register.py [helpers] [latency]
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+from typing import Union
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+import globals as g  # noqa: E402
+from entity_register import EntityRegister  # noqa: E402
+
+HELPERS = 1000  # per domain
+LATENCY = 0.2  # [s] one list on large install
+ROUNDS = 3
+
+
+class Cmd:
+    """ws_comm.Cmd - result after latency"""
+
+    def __init__(self, ws: "Ws", domain: str):
+        self.ws = ws
+        self.domain = domain
+        self.result: Union[list, None] = None
+        self.error_code = ""
+
+    async def wait(self) -> "Cmd":
+        if self.ws.lock is None:
+            await asyncio.sleep(self.ws.latency)
+        else:
+            async with self.ws.lock:
+                await asyncio.sleep(self.ws.latency)
+        self.result = [{"id": f"h_{i}"} for i in range(self.ws.helpers)]
+        return self
+
+
+class Ws:
+    def __init__(self, helpers: int, latency: float, serial: bool):
+        self.helpers = helpers
+        self.latency = latency
+        self.lock: Union[asyncio.Lock, None] = asyncio.Lock() if serial else None
+
+    def get_entities(self, domain: str) -> Cmd:
+        return Cmd(self, domain)
+
+
+class Register:
+    """EntityRegister without AppDaemon app"""
+
+    execute = EntityRegister.execute
+
+    def __init__(self, ws: Ws):
+        self.ws = ws
+
+    def debug(self, msg, *args):
+        pass
+
+    info = error = debug
+
+
+async def measure(helpers: int, latency: float, serial: bool) -> float:
+    register = Register(Ws(helpers, latency, serial))
+    elapsed = 0.0
+    for _ in range(ROUNDS):
+        queue: asyncio.Queue = asyncio.Queue()
+        await queue.put("entityRegister")
+        start = time.perf_counter()
+        await register.execute(queue)  # type: ignore
+        elapsed += time.perf_counter() - start
+    assert len(g.entity_register) == helpers * len(g.HELPERS)
+    return elapsed / ROUNDS
+
+
+async def main(helpers: int, latency: float):
+    print(
+        f"{len(g.HELPERS)} domains x {helpers} helpers, list latency {latency * 1000:.0f} ms"
+    )
+    results = {}
+    for name, serial in (("lists one by one", True), ("lists together", False)):
+        results[name] = await measure(helpers, latency, serial)
+        print(f"    {name:>16}: {results[name] * 1000:7.1f} ms")
+    speedup = results["lists one by one"] / results["lists together"]
+    print(f"    {'speedup':>16}: {speedup:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else HELPERS,
+            float(sys.argv[2]) if len(sys.argv) > 2 else LATENCY,
+        )
+    )
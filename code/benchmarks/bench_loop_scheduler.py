@@ -0,0 +1,130 @@
+""" Simulation of TaskLoop wakeups - former polling vs LoopScheduler of BufferControl
+
+LOOPS TaskLoop with frequence 2 - 11 s are running DURATION seconds (real time).
+Polling - every loop wakes up each second (former TaskLoop._main_loop).
+
+Run (AppDaemon installed):
+    python bench_loop_scheduler.py [loops] [duration]
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from buffer_control import EventBus, LoopScheduler  # noqa: E402
+from task_register import TaskLoop  # noqa: E402
+
+LOOPS = 40
+DURATION = 20
+
+
+class Parent:
+    """Minimal BufferInterface / BufferControl for TaskLoop and LoopScheduler"""
+
+    def __init__(self):
+        self.loop_scheduler = LoopScheduler(self)
+        self.buffer_control = self
+        self.bus = EventBus(self)
+
+    async def now(self) -> float:
+        return time.time()
+
+    async def create_task(self, coro, callback=None, **kwargs):
+        return asyncio.get_running_loop().create_task(coro)
+
+    async def sleep(self, delay):
+        await asyncio.sleep(delay)
+
+    async def fire_event(self, event, **kwargs):
+        pass
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+    def debug(self, msg, *args):
+        pass
+
+    info = warning = error = debug
+    debug_on = False
+
+
+class App:
+    """Owner of loop coroutines - TaskCoro calls methods"""
+
+    def __init__(self):
+        self.executions = 0
+
+    async def coro(self):
+        self.executions += 1
+
+
+def create_loops(parent: Parent, loops: int) -> tuple:
+    app = App()
+    tasks = []
+    for i in range(loops):
+        task = TaskLoop(reg_name=f"loop_{i}", coro=app.coro, frequence=2 + i % 10)
+        task.parent = parent  # type: ignore
+        tasks.append(task)
+    return tasks, app
+
+
+async def polling(loops: int, duration: float) -> tuple:
+    """Former TaskLoop._main_loop"""
+    parent = Parent()
+    tasks, app = create_loops(parent, loops)
+    wakeups = [0]
+
+    async def main_loop(task):
+        while True:
+            if task._loop_run and task.frequence > 0:
+                go_loop = await task._go_loop()
+                if go_loop is not None and go_loop:
+                    if await task._check_time_overflow():
+                        await task.exec_time_overflow()
+            await parent.sleep(1)
+            wakeups[0] += 1
+
+    handlers = [asyncio.create_task(main_loop(task)) for task in tasks]
+    await asyncio.sleep(duration)
+    for handler in handlers:
+        handler.cancel()
+    return wakeups[0], app.executions
+
+
+async def scheduler(loops: int, duration: float) -> tuple:
+    parent = Parent()
+    tasks, app = create_loops(parent, loops)
+    for task in tasks:
+        task._main_loop_started = True
+        parent.loop_scheduler.add(task)
+    await asyncio.sleep(duration)
+    parent.loop_scheduler.stop()
+    return parent.loop_scheduler.wakeups, app.executions
+
+
+async def main(loops: int, duration: float):
+    print(f"{loops} loops, {duration}s")
+    for name, run in (("polling", polling), ("LoopScheduler", scheduler)):
+        wakeups, executions = await run(loops, duration)
+        print(
+            f"{name:>14}: {wakeups / duration * 60:8.0f} wakeups/min"
+            f"  executions: {executions}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else LOOPS,
+            float(sys.argv[2]) if len(sys.argv) > 2 else DURATION,
+        )
+    )
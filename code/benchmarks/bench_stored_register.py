@@ -0,0 +1,73 @@
+""" Benchmark of MyHelp.stored_* - list register vs IndexedRegister
+
+Every operation is done for all entries of register.
+
+Run (AppDaemon installed):
+    python bench_stored_register.py [entries]
+"""
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from helper_tools import MyHelp as h  # noqa: E402
+from helper_types import IndexedRegister  # noqa: E402
+
+ENTRIES = 10000
+
+
+def measure(name: str, register, keys: list) -> dict:
+    result: dict = {}
+    start = time.perf_counter()
+    for key in keys:
+        h.stored_push(key, register, {"state": "off"})
+    result["push"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        h.stored_get(key, register)
+    result["get"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        h.stored_exists(key, register)
+    result["exists"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        h.stored_replace(key, register, {"state": "on"})
+    result["replace"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in reversed(keys):
+        h.stored_remove(key, register)
+    result["remove"] = time.perf_counter() - start
+    assert len(register) == 0
+    print(
+        f"{name:>16}: "
+        + "  ".join(f"{op} {elapsed * 1000:9.1f} ms" for op, elapsed in result.items())
+    )
+    return result
+
+
+def main(entries: int):
+    keys = [f"input_boolean.entity_{i}" for i in range(entries)]
+    print(f"{entries} entries")
+    linear = measure("list", [], keys)
+    indexed = measure("IndexedRegister", IndexedRegister(), keys)
+    print(
+        "         speedup: "
+        + "  ".join(f"{op} {linear[op] / indexed[op]:9.0f}x   " for op in linear)
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ENTRIES)
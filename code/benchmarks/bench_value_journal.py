@@ -0,0 +1,79 @@
+""" Benchmark of LastMile storing - rewrite of appf.yaml vs ValueJournal
+
+Former _listen_state read, searched and rewrote whole yaml for every change.
+
+Run (AppDaemon installed):
+    python bench_value_journal.py [entities] [changes]
+"""
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from helper_tools import MyHelp as h  # noqa: E402
+from value_journal import ENTITY_VALUES, ValueJournal  # noqa: E402
+
+ENTITIES = 200
+CHANGES = 1000
+
+
+def rewrite(filename: str, entity: str, new):
+    """Former LastMile._listen_state"""
+    stored_values: dict = h.get_yaml(filename)
+    if not ENTITY_VALUES in stored_values.keys():
+        stored_values[ENTITY_VALUES] = []
+    found = False
+    for ent_dict in stored_values[ENTITY_VALUES]:
+        if next(iter(ent_dict.keys())) == entity:
+            found = True
+            ent_dict.update({entity: new})
+            break
+    if not found:
+        stored_values[ENTITY_VALUES].append({entity: new})
+    h.save_yaml(filename, stored_values, sort_keys=True)
+
+
+def main(entities: int, changes: int):
+    keys = [f"input_number.entity_{i}" for i in range(entities)]
+    print(f"{entities} entities, {changes} changes")
+    with tempfile.TemporaryDirectory() as path:
+        filename = os.path.join(path, "appf.yaml")
+        for key in keys:
+            rewrite(filename, key, "0")
+        start = time.perf_counter()
+        for i in range(changes):
+            rewrite(filename, keys[i % entities], str(i))
+        former = time.perf_counter() - start
+
+        journal_filename = os.path.join(path, "appf_journal.yaml")
+        journal = ValueJournal(journal_filename)
+        for key in keys:
+            journal.set(key, "0")
+        journal.close()
+        journal.load()
+        start = time.perf_counter()
+        for i in range(changes):
+            journal.set(keys[i % entities], str(i))
+        journaled = time.perf_counter() - start
+        journal.close()
+
+        assert ValueJournal(filename).load() == ValueJournal(journal_filename).load()
+    print(f"    rewrite: {former / changes * 1e6:9.1f} us/change")
+    print(f"    journal: {journaled / changes * 1e6:9.1f} us/change")
+    print(f"    speedup: {former / journaled:9.0f}x")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else ENTITIES,
+        int(sys.argv[2]) if len(sys.argv) > 2 else CHANGES,
+    )
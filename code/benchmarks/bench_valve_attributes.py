@@ -0,0 +1,139 @@
+""" Benchmark of VentilABC.update_attributes against slow state backend
+
+Every state read of fake backend takes LATENCY seconds (round trip to
+Home Assistant). Serial backend handles one read at a time - latency of
+reads awaited one after another. Concurrent backend answers reads in
+parallel as AppDaemon does. Counted are state reads and attributes written
+to stat sensor - only changed attributes are published.
+
+Run (AppDaemon installed, global_topeni importable - apps directory):
+    python bench_valve_attributes.py [cycles] [latency]
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+from typing import Union
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+import globals as g  # noqa: E402
+from devices_interface import HEAT_PAR, VALVE_OPERATION, VentilABC  # noqa: E402
+
+CYCLES = 20
+LATENCY = 0.005  # [s] one state read
+WINDOWS = ("binary_sensor.okno_1", "binary_sensor.okno_2")
+
+
+class Backend:
+    """Minimal BasicApp - state reads with latency"""
+
+    global_vars: dict = {}
+    debug_on = False
+
+    def __init__(self, latency: float, serial: bool):
+        self.latency = latency
+        self._lock: Union[asyncio.Lock, None] = asyncio.Lock() if serial else None
+        self.reads = 0
+        self.published = 0
+        self.temperature = 20.0
+
+    def debug(self, msg, *args):
+        pass
+
+    info = warning = error = debug
+
+    async def _read(self, value):
+        self.reads += 1
+        if self._lock is None:
+            await asyncio.sleep(self.latency)
+            return value
+        async with self._lock:
+            await asyncio.sleep(self.latency)
+        return value
+
+    async def get_state_float(self, entity_id: str) -> float:
+        return await self._read(self.temperature)
+
+    async def get_state_int(self, entity_id: str) -> int:
+        return int(await self.get_state_float(entity_id))
+
+    async def is_entity_on(self, entity_id: str) -> bool:
+        return await self._read(False)
+
+    async def set_sensor_state(self, entity_id, state, attr) -> bool:
+        self.published += len(attr)
+        await asyncio.sleep(self.latency)
+        return True
+
+    async def run_in_executor(self, func, *args):
+        return func(*args)
+
+
+class BenchVentil(VentilABC):
+    def get_operating_mode(self, oper_mode) -> VALVE_OPERATION:
+        return VALVE_OPERATION.UNKNOWN
+
+    async def async_setup(self):
+        pass
+
+    async def get_battery_status(self) -> int:
+        return await self._ba.get_state_int("sensor.baterie")
+
+
+def create_valve(backend: Backend) -> BenchVentil:
+    valve = BenchVentil(
+        _ba=backend,  # type: ignore
+        name_id="bench",
+        params={
+            HEAT_PAR.WINDOWS: list(WINDOWS),
+            HEAT_PAR.TARGET_TEMPERATURE: "input_number.target",
+        },
+    )
+    valve.stat_id = "sensor.bench_stat"
+    valve.sensor_temperature = "sensor.teplota"
+    valve.has_ha_control = True
+    valve.control_entity = "input_boolean.bench"
+    return valve
+
+
+async def measure(cycles: int, latency: float, serial: bool):
+    backend = Backend(latency, serial)
+    valve = create_valve(backend)
+    start = time.perf_counter()
+    for i in range(cycles):
+        backend.temperature = 20.0 + i % 3  # some attributes are changing
+        await valve.update_attributes()
+    elapsed = time.perf_counter() - start
+    return elapsed / cycles, backend.reads / cycles, backend.published / cycles
+
+
+async def main(cycles: int, latency: float):
+    g.time_zone = "UTC"  # set from appdaemon.yaml in BasicApp
+    print(f"{cycles} cycles, read latency {latency * 1000:.1f} ms")
+    results = {}
+    for name, serial in (("reads one by one", True), ("reads gathered", False)):
+        per_valve, reads, published = await measure(cycles, latency, serial)
+        results[name] = per_valve
+        print(
+            f"    {name:>18}: {per_valve * 1000:7.1f} ms/valve,"
+            f" {reads:.0f} reads, {published:.1f} attributes published"
+        )
+    speedup = results["reads one by one"] / results["reads gathered"]
+    print(f"    {'speedup':>18}: {speedup:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else CYCLES,
+            float(sys.argv[2]) if len(sys.argv) > 2 else LATENCY,
+        )
+    )
@@ -0,0 +1,134 @@
+""" Benchmark of ValveClass.update_state with N valves
+
+Every valve update takes DELAY seconds (state reads, service calls), one
+valve is dead and raises. Measured is one UPDATE_STATE iteration for
+valve_concurrency 1 (valves one after another) up to all valves at once,
+counted are valves updated despite the dead one.
+
+Run (AppDaemon installed, global_topeni importable - apps directory):
+    python bench_valve_update.py [valves] [delay]
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+try:
+    import hassapi  # type: ignore  # noqa: F401
+except ModuleNotFoundError:
+    # inside AppDaemon apps it is importable directly
+    sys.modules["hassapi"] = importlib.import_module("appdaemon.plugins.hass.hassapi")
+
+from devices_interface import (  # noqa: E402
+    INTERFACE_TYPE,
+    VALVE_OPERATION,
+    DeviceRegister,
+    VentilABC,
+)
+from valve_interface import ValveClass  # noqa: E402
+
+VALVES = 15
+DELAY = 0.05  # [s] one valve update
+DEAD_VALVE = 0  # index of valve raising exception
+
+
+class Parent:
+    """Minimal BasicApp for valves"""
+
+    global_vars: dict = {}
+    debug_on = False
+
+    def __init__(self):
+        self.errors = 0
+
+    def debug(self, msg, *args):
+        pass
+
+    info = warning = debug
+
+    def error(self, msg, *args):
+        self.errors += 1
+
+
+class BenchVentil(VentilABC):
+    delay: float = DELAY
+    updated: int = 0
+
+    def get_operating_mode(self, oper_mode) -> VALVE_OPERATION:
+        return VALVE_OPERATION.UNKNOWN
+
+    async def async_setup(self):
+        pass
+
+    async def get_battery_status(self) -> int:
+        return 0
+
+    async def valve_update_state(self) -> None:
+        await asyncio.sleep(self.delay)
+        if self.dead:
+            raise ConnectionError(f"{self.name_id} is not responding")
+        self.updated += 1
+
+
+class Valves(Parent):
+    """ValveClass.update_state without AppDaemon app"""
+
+    interface = INTERFACE_TYPE.FIBARO
+    update_state = ValveClass.update_state
+    _valve_update_state = ValveClass._valve_update_state
+
+    def __init__(self, valve_concurrency: int):
+        super().__init__()
+        self.valve_concurrency = valve_concurrency
+
+
+def register_valves(valves: int, delay: float):
+    parent = Parent()
+    for i in range(valves):
+        valve = BenchVentil(
+            _ba=parent,  # type: ignore
+            name_id=f"valve_{i}",
+            device_id=f"device_{i}",
+            interface=INTERFACE_TYPE.FIBARO,
+            dead=i == DEAD_VALVE,
+        )
+        valve.delay = delay
+        DeviceRegister.register(parent, valve)
+
+
+async def measure(valve_concurrency: int):
+    valves = Valves(valve_concurrency)
+    start = time.perf_counter()
+    await valves.update_state()  # type: ignore
+    elapsed = time.perf_counter() - start
+    updated = sum(
+        valve.updated
+        for valve in DeviceRegister.get_interface_entities(INTERFACE_TYPE.FIBARO)
+        if isinstance(valve, BenchVentil)
+    )
+    return elapsed, updated, valves.errors
+
+
+async def main(valves: int, delay: float):
+    register_valves(valves, delay)
+    print(f"{valves} valves, {delay * 1000:.0f} ms per valve, one dead valve")
+    for valve_concurrency in sorted({1, 2, 4, 8, valves}):
+        for valve in DeviceRegister.get_interface_entities(INTERFACE_TYPE.FIBARO):
+            valve.updated = 0  # type: ignore
+        elapsed, updated, errors = await measure(valve_concurrency)
+        print(
+            f"    valve_concurrency {valve_concurrency:>3}: {elapsed * 1000:7.1f} ms,"
+            f" {updated} updated, {errors} failed"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else VALVES,
+            float(sys.argv[2]) if len(sys.argv) > 2 else DELAY,
+        )
+    )
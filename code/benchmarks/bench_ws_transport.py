@@ -0,0 +1,91 @@
+""" Benchmark of WsHA transports - commands per second
+
+Local stand-in of HA websocket api (auth + result for every command).
+Compares ExecutorTransport (websocket-client via executor) with AsyncTransport (aiohttp).
+
+Run:
+    python bench_ws_transport.py [commands]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app_framework"))
+
+from aiohttp import web  # type: ignore  # noqa: E402
+from ws_transport import (  # noqa: E402
+    TRANSPORT_ASYNC,
+    TRANSPORT_EXECUTOR,
+    WsTransport,
+    create_transport,
+)
+
+COMMANDS = 2000
+HOST = "127.0.0.1"
+
+
+async def ha_stand_in(request):
+    ws = web.WebSocketResponse(max_msg_size=0)
+    await ws.prepare(request)
+    await ws.send_str(json.dumps({"type": "auth_required"}))
+    async for msg in ws:
+        data = json.loads(msg.data)
+        if data.get("type") == "auth":
+            await ws.send_str(json.dumps({"type": "auth_ok"}))
+            continue
+        await ws.send_str(
+            json.dumps(
+                {"id": data.get("id"), "type": "result", "success": True, "result": []}
+            )
+        )
+    return ws
+
+
+async def start_server() -> tuple:
+    app = web.Application()
+    app.router.add_get("/api/websocket", ha_stand_in)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"ws://{HOST}:{port}/api/websocket"
+
+
+async def run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def run_commands(transport: WsTransport, url: str, commands: int) -> float:
+    """Same sequence as WsHA - auth, then send and wait for result"""
+    await transport.connect(url)
+    await transport.recv()
+    await transport.send(json.dumps({"type": "auth", "access_token": "bench"}))
+    await transport.recv()
+    start = time.perf_counter()
+    for id in range(1, commands + 1):
+        await transport.send(json.dumps({"id": id, "type": "input_boolean/list"}))
+        await transport.recv()
+    elapsed = time.perf_counter() - start
+    await transport.aclose()
+    return elapsed
+
+
+async def main(commands: int):
+    runner, url = await start_server()
+    try:
+        for kind in (TRANSPORT_EXECUTOR, TRANSPORT_ASYNC):
+            transport = create_transport(kind, run_in_executor)
+            elapsed = await run_commands(transport, url, commands)
+            print(
+                f"{kind:>9}: {commands} commands in {elapsed:.3f}s"
+                f" -> {commands / elapsed:,.0f} cmd/s"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else COMMANDS))
@@ -18,6 +18,8 @@ SENSOR_HONEY_INFO = "sensor.honeywell_info"  # {"friendly_name": "Info Honeywell
 TEMP_OPERATION_MAX = 35
 TEMP_OPERATION_MIN = 5
 
+AUTHORIZE_TIMEOUT = 6 * 60  # _authorize is sleeping 5 minutes after failures
+
 
 class HoneywellTaskName(AutoName):
     AUTHORIZE = auto()
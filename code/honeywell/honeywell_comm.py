@@ -22,6 +22,7 @@ from evohome_comm.controlsystem import ControlSystem
 from evohome_comm.zone import Zone
 
 from global_honeywell import (
+    AUTHORIZE_TIMEOUT,
     HONEYWELL_COMM_INSTANCE,
     SENSOR_HONEY_INFO,
     SENSOR_REQ,
@@ -179,6 +180,7 @@ class HoneywellComm(ValveClass):
                 self,
                 reg_name=HoneywellTaskName.AUTHORIZE,
                 coro=self._authorize,
+                timeout=AUTHORIZE_TIMEOUT,
             )
         )
         self.register_task(
@@ -224,10 +226,12 @@ class HoneywellComm(ValveClass):
 
     def read_state(self):
         self.info("Honeywell is asking for state")
+        ventils = DeviceRegister.get_entities(
+            (temperature.id for temperature in self.temperatures),
+            interface=INTERFACE_TYPE.HONEYWELL,
+        )
         for temperature in self.temperatures:  # Honeywell cloud
-            ventil = DeviceRegister.get_entity(
-                device_id=temperature.id, interface=INTERFACE_TYPE.HONEYWELL
-            )
+            ventil = ventils.get(temperature.id)
             if ventil is None:
                 self.warning(f"Not found temp {temperature.id}")
                 continue